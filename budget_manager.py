@@ -0,0 +1,290 @@
+import fcntl
+import json
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from currency import CurrencyError, load_rate_table
+from ledger import Ledger, get_ledger_dir
+from recurring import pending_occurrences
+from schema import BASE_CURRENCY, LedgerEntry, MonthData, UserStore, new_user, replace
+from tracing import TraceRecorder, traced
+
+
+class StaleSnapshotError(Exception):
+    pass
+
+
+class BudgetManager:
+    def __init__(self, data_file="budget_data.json", users_file="users.json", rates_file="rates.json",
+                 trace_file=None):
+        self.data_file = data_file
+        self.users_file = users_file
+        self.rates_file = rates_file
+        # Enregistrement facultatif des mutations, pour les rejouer avec tracing.py
+        self.recorder = TraceRecorder(trace_file, data_file, users_file, rates_file) if trace_file else None
+        self.ledger = Ledger(get_ledger_dir(data_file))
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._changed = set()
+        self._ledger_entries = []
+        self._listeners = []
+        self.load_data()
+    
+    def load_data(self):
+        self._data_state = self._get_file_state()
+        try:
+            with open(self.data_file, 'rb') as f:
+                self.data = UserStore.from_bytes(f.read())
+        except FileNotFoundError:
+            self.data = UserStore()
+        
+        try:
+            with open(self.users_file, 'r', encoding='utf-8') as f:
+                self.users = json.load(f)
+        except:
+            self.users = {}
+    
+    def save_data(self):
+        self._write_file(self.data_file, self.data.to_bytes())
+        self._write_file(self.users_file, json.dumps(self.users, ensure_ascii=False, indent=2).encode('utf-8'))
+        self._data_state = self._get_file_state()
+    
+    def _get_file_state(self):
+        # Chaque écriture remplace le fichier : un nouvel inode suffit à la détecter
+        try:
+            stat = os.stat(self.data_file)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+    
+    def refresh_if_changed(self):
+        # Recharge si un autre processus (rollover, restauration...) a réécrit le fichier
+        with self._lock:
+            if self._get_file_state() != self._data_state:
+                self.load_data()
+    
+    @contextmanager
+    def transaction(self):
+        # Lecture-modification-écriture protégée contre les autres processus qui écrivent
+        # le même fichier : verrou de fichier, rechargement si le fichier a changé depuis
+        # la dernière lecture, une seule écriture à la fin. Si une erreur interrompt la
+        # transaction, les modifications en mémoire sont abandonnées.
+        with self._lock:
+            if self._lock_file is not None:
+                yield
+                return
+            self._lock_file = open(f"{self.data_file}.lock", 'a')
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                self.refresh_if_changed()
+                try:
+                    yield
+                except BaseException:
+                    self._ledger_entries.clear()
+                    if self._changed:
+                        self._changed.clear()
+                        self.load_data()
+                    raise
+                changed, self._changed = self._changed, set()
+                entries, self._ledger_entries = self._ledger_entries, []
+                if changed:
+                    self.save_data()
+                # Journal écrit seulement une fois les données sur disque ; après un arrêt
+                # entre les deux, le journal est rapproché du solde à l'écriture suivante
+                for username, entry, previous_balance in entries:
+                    self.ledger.record(username, entry, previous_balance)
+            finally:
+                # La fermeture libère le verrou
+                self._lock_file.close()
+                self._lock_file = None
+        for username in changed:
+            for listener in self._listeners:
+                listener(username)
+    
+    def _write_file(self, path, content):
+        # Écriture atomique : un crash ne laisse jamais un fichier à moitié écrit
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    
+    @property
+    def rates(self):
+        return load_rate_table(self.rates_file)
+    
+    def hash_password(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+    
+    @traced(redact=('password',))
+    def register_user(self, username, password):
+        with self.transaction():
+            if username in self.users:
+                return False
+            self.users[username] = self.hash_password(password)
+            self.data[username] = new_user()
+            self._changed.add(username)
+        return True
+    
+    def authenticate(self, username, password):
+        if username not in self.users:
+            return False
+        return self.users[username] == self.hash_password(password)
+    
+    def get_user_data(self, username):
+        # Instantané figé, partageable entre sessions sans copie
+        return self.data.get(username) or new_user()
+    
+    def add_listener(self, listener):
+        # Appelé avec le nom d'utilisateur après chaque transaction écrite sur disque
+        self._listeners.append(listener)
+    
+    def _commit(self, username, change, expected_version=None, entry=None):
+        # Copie sur écriture : seuls les objets modifiés sont recréés,
+        # les mois inchangés sont partagés avec la version précédente.
+        # La version attendue est comparée aux données relues sous le verrou de fichier.
+        # Toute variation du petit coffre est inscrite au journal (entry : kind, description...).
+        with self.transaction():
+            current = self.get_user_data(username)
+            if expected_version is not None and current.version != expected_version:
+                raise StaleSnapshotError(
+                    f"Version {expected_version} périmée pour {username} (actuelle : {current.version})"
+                )
+            updated = replace(change(current), version=current.version + 1)
+            self.data[username] = updated
+            self._changed.add(username)
+            amount = updated.savings - current.savings
+            if amount or entry is not None:
+                self._ledger_entries.append((username, LedgerEntry(
+                    amount=amount,
+                    timestamp=datetime.now().isoformat(),
+                    **(entry or {'kind': 'adjustment'})
+                ), current.savings))
+        return updated
+    
+    def _replace_month(self, user_data, month_key, month_data):
+        months = dict(user_data.months)
+        months[month_key] = month_data
+        return replace(user_data, months=months)
+    
+    @traced()
+    def save_month_budget(self, username, month_key, budget, expected_version=None):
+        def change(user_data):
+            month_data = user_data.months.get(month_key) or MonthData()
+            return self._replace_month(user_data, month_key, replace(month_data, budget=dict(budget)))
+        return self._commit(username, change, expected_version)
+    
+    @traced()
+    def create_month(self, username, month_key, month_data, carried_savings=0):
+        def change(user_data):
+            user_data = self._replace_month(user_data, month_key, month_data)
+            return replace(user_data, savings=user_data.savings + carried_savings)
+        entry = {'kind': 'rollover', 'month_key': month_key} if carried_savings else None
+        return self._commit(username, change, entry=entry)
+    
+    @traced()
+    def add_expense(self, username, month_key, expense, expected_version=None):
+        return self.add_expenses(username, month_key, [expense], expected_version)
+    
+    def add_expenses(self, username, month_key, new_expenses, expected_version=None):
+        # Les totaux par catégorie restent en devise de base, au taux du jour de chaque dépense
+        amounts = self.rates.convert(
+            [e.amount for e in new_expenses],
+            [e.currency for e in new_expenses],
+            [e.date or 'NaT' for e in new_expenses]
+        )
+        def change(user_data):
+            month_data = user_data.months[month_key]
+            expenses = dict(month_data.expenses)
+            for expense, amount in zip(new_expenses, amounts):
+                expenses[expense.category] = expenses.get(expense.category, 0) + round(amount)
+            month_data = replace(
+                month_data,
+                expenses=expenses,
+                expense_details=month_data.expense_details + tuple(new_expenses)
+            )
+            return self._replace_month(user_data, month_key, month_data)
+        return self._commit(username, change, expected_version)
+    
+    @traced(skip_none=True)
+    def generate_recurring(self, username, month_key, until):
+        # Occurrences échues ajoutées en un seul commit ; sous le verrou, une relance
+        # ou une autre session ne peut pas les ajouter deux fois
+        with self.transaction():
+            user_data = self.get_user_data(username)
+            if not user_data.recurring or month_key not in user_data.months:
+                return None
+            due, _ = pending_occurrences(user_data, month_key, until)
+            if not due:
+                return None
+            return self.add_expenses(username, month_key, due)
+    
+    @traced()
+    def add_recurring_rule(self, username, rule, expected_version=None):
+        def change(user_data):
+            return replace(user_data, recurring=user_data.recurring + (rule,))
+        return self._commit(username, change, expected_version)
+    
+    @traced()
+    def remove_recurring_rule(self, username, rule_id, expected_version=None):
+        # Les occurrences déjà enregistrées sont conservées
+        def change(user_data):
+            return replace(user_data, recurring=tuple(r for r in user_data.recurring if r.id != rule_id))
+        return self._commit(username, change, expected_version)
+    
+    @traced(defaults={'on': lambda: date.today().isoformat()})
+    def add_income(self, username, amount, description="", currency=BASE_CURRENCY, expected_version=None, on=None):
+        # on : date du taux de conversion, aujourd'hui par défaut
+        entry = {'kind': 'income', 'description': description, 'currency': currency, 'original_amount': amount}
+        amount = round(self.rates.convert_one(amount, currency, on or date.today().isoformat()))
+        def change(user_data):
+            return replace(user_data, savings=user_data.savings + amount)
+        return self._commit(username, change, expected_version, entry=entry)
+    
+    @traced()
+    def allocate_savings(self, username, month_key, allocation, expected_version=None):
+        def change(user_data):
+            total = sum(allocation.values())
+            if total > user_data.savings:
+                raise ValueError("Le montant total dépasse le montant disponible dans le coffre")
+            month_data = user_data.months[month_key]
+            budget = dict(month_data.budget)
+            for category, amount in allocation.items():
+                if amount > 0:
+                    budget[category] = budget.get(category, 0) + amount
+            user_data = self._replace_month(user_data, month_key, replace(month_data, budget=budget))
+            return replace(user_data, savings=user_data.savings - total)
+        entry = {
+            'kind': 'allocation',
+            'month_key': month_key,
+            'allocation': {c: amount for c, amount in allocation.items() if amount > 0}
+        }
+        return self._commit(username, change, expected_version, entry=entry)
+    
+    @traced()
+    def reset_savings(self, username, expected_version=None):
+        def change(user_data):
+            return replace(user_data, savings=0)
+        return self._commit(username, change, expected_version, entry={'kind': 'reset'})
+    
+    @traced()
+    def set_currency(self, username, currency, expected_version=None):
+        if currency not in self.rates.currencies:
+            raise CurrencyError(f"Devise inconnue : {currency}")
+        def change(user_data):
+            return replace(user_data, currency=currency)
+        return self._commit(username, change, expected_version)
+    
+    @traced()
+    def restore_user_data(self, username, user_data):
+        # La version continue de croître : les instantanés antérieurs restent périmés
+        entry = {'kind': 'adjustment', 'description': "Restauration d'un instantané"}
+        return self._commit(username, lambda current: user_data, entry=entry)
+    
+    @traced()
+    def reset_user(self, username, expected_version=None):
+        def change(user_data):
+            return new_user()
+        return self._commit(username, change, expected_version, entry={'kind': 'reset'})
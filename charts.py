@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from schema import BASE_CURRENCY
+
+# Nombre maximal de points envoyés au navigateur par courbe
+MAX_CHART_POINTS = 1500
+# Au-delà, les courbes sont rendues en WebGL plutôt qu'en SVG
+WEBGL_THRESHOLD = 1000
+
+RESOLUTIONS = {
+    'day': ('D', "Jour"),
+    'week': ('W-MON', "Semaine"),
+    'month': ('MS', "Mois")
+}
+
+
+def choose_resolution(start, end, max_points=MAX_CHART_POINTS):
+    # La résolution la plus fine qui tient dans le budget de points
+    days = (end - start).days + 1
+    if days <= max_points:
+        return 'day'
+    if days / 7 <= max_points:
+        return 'week'
+    return 'month'
+
+
+def aggregate(series, resolution):
+    # series : montants indexés par date, sommés par période
+    if series.empty:
+        return series
+    return series.resample(RESOLUTIONS[resolution][0]).sum()
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets : garde les points qui préservent la forme
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        indices[i + 1] = previous
+    return indices
+
+
+def downsample(series, max_points=MAX_CHART_POINTS):
+    if len(series) <= max_points:
+        return series
+    indices = lttb(series.index.asi8, series.to_numpy(), max_points)
+    return series.iloc[indices]
+
+
+def make_trace(series, name, color, max_points=MAX_CHART_POINTS, **kwargs):
+    series = downsample(series, max_points)
+    trace_type = go.Scattergl if len(series) > WEBGL_THRESHOLD else go.Scatter
+    mode = 'lines' if len(series) > 100 else 'lines+markers'
+    return trace_type(
+        x=series.index,
+        y=series.to_numpy(),
+        mode=mode,
+        name=name,
+        line=dict(color=color, width=3 if mode == 'lines+markers' else 2),
+        **kwargs
+    )
+
+
+def build_daily_spending(months, rates=None, currency=BASE_CURRENCY):
+    # Dépenses par jour sur tout l'historique, indexées par date
+    dates = []
+    amounts = []
+    currencies = []
+    for month_data in months.values():
+        for expense in month_data.expense_details:
+            dates.append(expense.date)
+            amounts.append(expense.amount)
+            currencies.append(expense.currency)
+    if not dates:
+        return pd.Series(dtype=float)
+    index = pd.to_datetime(dates, errors='coerce')
+    if rates is not None:
+        amounts = rates.convert(amounts, currencies, index.values.astype('datetime64[D]'), currency)
+    series = pd.Series(amounts, index=index, dtype=float)
+    series = series[series.index.notna()]
+    return series.groupby(level=0).sum().sort_index()
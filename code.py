@@ -3,10 +3,21 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
-import json
-import hashlib
+import os
+import time
 from pathlib import Path
 
+from budget_manager import BudgetManager, StaleSnapshotError
+from charts import RESOLUTIONS, aggregate, build_daily_spending, choose_resolution, make_trace
+from currency import currency_label, format_amount, month_totals, totals_by_category
+from dashboard import DashboardViews, build_dashboard_view
+from forecast import forecast_user
+from ledger import ENTRY_KINDS
+from recurring import FREQUENCIES, new_rule, pending_occurrences
+from reports import build_report
+from schema import BASE_CURRENCY, Expense, encode_user, to_builtins
+from snapshots import SnapshotError, list_snapshots, restore, take_snapshot
+
 st.set_page_config(
     page_title="💰 Mon Budget Personnel",
     page_icon="💰",
@@ -92,58 +103,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class BudgetManager:
-    def __init__(self):
-        self.data_file = "budget_data.json"
-        self.users_file = "users.json"
-        self.load_data()
-    
-    def load_data(self):
-        try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
-        except:
-            self.data = {}
-        
-        try:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                self.users = json.load(f)
-        except:
-            self.users = {}
-    
-    def save_data(self):
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-        
-        with open(self.users_file, 'w', encoding='utf-8') as f:
-            json.dump(self.users, f, ensure_ascii=False, indent=2)
-    
-    def hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
-    
-    def register_user(self, username, password):
-        if username in self.users:
-            return False
-        self.users[username] = self.hash_password(password)
-        self.data[username] = {
-            'months': {},
-            'savings': 0
-        }
-        self.save_data()
-        return True
-    
-    def authenticate(self, username, password):
-        if username not in self.users:
-            return False
-        return self.users[username] == self.hash_password(password)
-    
-    def get_user_data(self, username):
-        return self.data.get(username, {'months': {}, 'savings': 0})
-    
-    def update_user_data(self, username, data):
-        self.data[username] = data
-        self.save_data()
-
 def login_page():
     st.markdown('<div class="main-header"><h1>💰 Mon Budget Personnel</h1><p>Gérez vos finances en toute simplicité</p></div>', unsafe_allow_html=True)
     
@@ -158,6 +117,9 @@ def login_page():
             if budget_manager.authenticate(username, password):
                 st.session_state.logged_in = True
                 st.session_state.username = username
+                st.session_state.pop('seen_version', None)
+                # Le tableau de bord est précalculé pendant le rechargement de la page
+                dashboard_views.schedule(username)
                 st.success("✅ Connexion réussie!")
                 st.rerun()
             else:
@@ -199,9 +161,64 @@ def sidebar_navigation():
         "⚙️ Paramètres": "settings"
     }
     
+    if is_admin(st.session_state.username):
+        pages["🛠️ Administration"] = "admin"
+    
     selected = st.sidebar.radio("Navigation", list(pages.keys()))
     return pages[selected]
 
+def is_admin(username):
+    admins = os.environ.get("BUDGET_ADMINS", "")
+    return username in [a.strip() for a in admins.split(",") if a.strip()]
+
+def get_user_snapshot():
+    user_data = budget_manager.get_user_data(st.session_state.username)
+    # Les actions de l'utilisateur portent sur la version affichée au rendu précédent
+    st.session_state.expected_version = st.session_state.get('seen_version', user_data.version)
+    st.session_state.seen_version = user_data.version
+    return user_data
+
+def ensure_recurring(month_key):
+    # Écriture système idempotente : elle ne rend pas périmée la version vue par l'utilisateur
+    updated = budget_manager.generate_recurring(st.session_state.username, month_key, date.today().isoformat())
+    if updated is not None and st.session_state.get('seen_version') == updated.version - 1:
+        st.session_state.seen_version = updated.version
+    return updated
+
+def commit(mutation, *args):
+    try:
+        mutation(st.session_state.username, *args, expected_version=st.session_state.expected_version)
+        return True
+    except StaleSnapshotError:
+        st.warning("⚠️ Vos données ont été modifiées depuis une autre session. La page affiche désormais la dernière version : vérifiez puis recommencez.")
+        return False
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return False
+
+def to_display(amount, currency, on=None):
+    # Montant stocké en devise de base, converti dans la devise d'affichage
+    return budget_manager.rates.convert_one(amount, BASE_CURRENCY, on, currency)
+
+def amount_input(label, currency, value=0, max_value=None, step=None, key=None):
+    # FCFA sans décimales, devises étrangères au centime
+    if currency == BASE_CURRENCY:
+        return st.number_input(
+            label, min_value=0, value=int(round(value)),
+            max_value=None if max_value is None else int(max_value),
+            step=step or 100, key=key
+        )
+    return st.number_input(
+        label, min_value=0.0, value=float(value),
+        max_value=None if max_value is None else float(max_value),
+        step=float(step or 1), format="%.2f", key=key
+    )
+
+def currency_selectbox(label, default, key=None):
+    currencies = budget_manager.rates.currencies
+    index = currencies.index(default) if default in currencies else 0
+    return st.selectbox(label, currencies, index=index, format_func=currency_label, key=key)
+
 def get_current_month_key():
     return datetime.now().strftime("%Y-%m")
 
@@ -211,8 +228,19 @@ def get_categories():
 def dashboard_page():
     st.markdown('<div class="main-header"><h1>📊 Tableau de bord</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
+    render_start = time.perf_counter()
     current_month = get_current_month_key()
+    user_data = get_user_snapshot()
+    
+    # Vue précalculée par le thread de fond, qui génère aussi les dépenses récurrentes ;
+    # recalculée ici si elle est périmée, et reprogrammée pour le prochain rendu
+    rates = budget_manager.rates
+    view = dashboard_views.get(st.session_state.username, user_data.version, current_month, rates.version)
+    precomputed = view is not None
+    if not precomputed:
+        view = build_dashboard_view(user_data, current_month, rates)
+        dashboard_views.put(st.session_state.username, view)
+        dashboard_views.schedule(st.session_state.username)
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -220,83 +248,75 @@ def dashboard_page():
         st.markdown("""
         <div class="metric-card">
             <h3 style="color: #667eea; margin: 0;">💰 Petit Coffre</h3>
-            <h2 style="margin: 0;">{:,.0f} FCFA</h2>
+            <h2 style="margin: 0;">{}</h2>
         </div>
-        """.format(user_data.get('savings', 0)), unsafe_allow_html=True)
+        """.format(format_amount(view.savings, view.currency)), unsafe_allow_html=True)
     
-    if current_month in user_data.get('months', {}):
-        month_data = user_data['months'][current_month]
-        total_budget = sum(month_data.get('budget', {}).values())
-        total_spent = sum(month_data.get('expenses', {}).values())
-        
+    if view.has_month:
         with col2:
             st.markdown("""
             <div class="metric-card">
                 <h3 style="color: #28a745; margin: 0;">📈 Budget Total</h3>
-                <h2 style="margin: 0;">{:,.0f} FCFA</h2>
+                <h2 style="margin: 0;">{}</h2>
             </div>
-            """.format(total_budget), unsafe_allow_html=True)
+            """.format(format_amount(view.total_budget, view.currency)), unsafe_allow_html=True)
         
         with col3:
             st.markdown("""
             <div class="metric-card">
                 <h3 style="color: #ffc107; margin: 0;">💸 Dépenses</h3>
-                <h2 style="margin: 0;">{:,.0f} FCFA</h2>
+                <h2 style="margin: 0;">{}</h2>
             </div>
-            """.format(total_spent), unsafe_allow_html=True)
+            """.format(format_amount(view.total_spent, view.currency)), unsafe_allow_html=True)
         
         with col4:
-            remaining = total_budget - total_spent
+            remaining = view.remaining
             color = "#28a745" if remaining >= 0 else "#dc3545"
             st.markdown("""
             <div class="metric-card">
                 <h3 style="color: {}; margin: 0;">💎 Reste</h3>
-                <h2 style="margin: 0; color: {}">{:,.0f} FCFA</h2>
+                <h2 style="margin: 0; color: {}">{}</h2>
             </div>
-            """.format(color, color, remaining), unsafe_allow_html=True)
+            """.format(color, color, format_amount(remaining, view.currency)), unsafe_allow_html=True)
         
         # Graphiques
         col1, col2 = st.columns(2)
         
         with col1:
-            if month_data.get('budget'):
-                fig = px.pie(
-                    values=list(month_data['budget'].values()),
-                    names=list(month_data['budget'].keys()),
-                    title="Répartition du Budget",
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_layout(showlegend=True, height=400)
-                st.plotly_chart(fig, use_container_width=True)
+            if view.budget_figure:
+                st.plotly_chart(view.budget_figure, use_container_width=True)
         
         with col2:
-            if month_data.get('expenses'):
-                fig = px.bar(
-                    x=list(month_data['expenses'].keys()),
-                    y=list(month_data['expenses'].values()),
-                    title="Dépenses par Catégorie",
-                    color=list(month_data['expenses'].values()),
-                    color_continuous_scale="RdYlBu_r"
-                )
-                fig.update_layout(showlegend=False, height=400)
-                st.plotly_chart(fig, use_container_width=True)
+            if view.expenses_figure:
+                st.plotly_chart(view.expenses_figure, use_container_width=True)
+    
+    age = (datetime.now() - view.built_at).total_seconds()
+    source = "vue précalculée" if precomputed else "calcul direct"
+    st.caption(
+        f"⚡ {source} · mise à jour il y a {age:.0f} s (calcul {view.build_time * 1000:.0f} ms) · "
+        f"rendu en {(time.perf_counter() - render_start) * 1000:.0f} ms"
+    )
 
 def planning_page():
     st.markdown('<div class="main-header"><h1>📋 Planification Mensuelle</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
+    user_data = get_user_snapshot()
     current_month = get_current_month_key()
     month_name = datetime.now().strftime("%B %Y")
     
     st.markdown(f"### 📅 Planification pour {month_name}")
     
-    if current_month in user_data.get('months', {}):
+    # Budgets saisis dans la devise d'affichage, stockés en devise de base
+    currency = user_data.currency
+    month_rate = budget_manager.rates.rates_at(currency, [f"{current_month}-01"])[0]
+    
+    if current_month in user_data.months:
         st.markdown("""
         <div class="warning-alert">
             ⚠️ Vous avez déjà une planification pour ce mois. Vous pouvez la modifier ci-dessous.
         </div>
         """, unsafe_allow_html=True)
-        existing_budget = user_data['months'][current_month].get('budget', {})
+        existing_budget = {c: amount / month_rate for c, amount in user_data.months[current_month].budget.items()}
     else:
         existing_budget = {}
     
@@ -310,50 +330,49 @@ def planning_page():
     for i, category in enumerate(categories):
         col = col1 if i % 2 == 0 else col2
         with col:
-            budget[category] = st.number_input(
+            budget[category] = amount_input(
                 f"💰 {category}",
-                min_value=0,
+                currency,
                 value=existing_budget.get(category, 0),
-                step=1000,
+                step=1000 if currency == BASE_CURRENCY else 10,
                 key=f"budget_{category}"
             )
     
     st.markdown('</div>', unsafe_allow_html=True)
     
     total_budget = sum(budget.values())
-    st.markdown(f"### 💎 Budget Total: {total_budget:,.0f} FCFA")
+    st.markdown(f"### 💎 Budget Total: {format_amount(total_budget, currency)}")
     
     if st.button("✅ Valider la planification", use_container_width=True):
         if total_budget > 0:
-            if 'months' not in user_data:
-                user_data['months'] = {}
-            
-            if current_month not in user_data['months']:
-                user_data['months'][current_month] = {
-                    'budget': {},
-                    'expenses': {},
-                    'expense_details': []
-                }
-            
-            user_data['months'][current_month]['budget'] = budget
-            budget_manager.update_user_data(st.session_state.username, user_data)
-            
-            st.markdown("""
-            <div class="success-alert">
-                ✅ Planification sauvegardée avec succès!
-            </div>
-            """, unsafe_allow_html=True)
-            st.rerun()
+            base_budget = {c: round(amount * month_rate) for c, amount in budget.items()}
+            if commit(budget_manager.save_month_budget, current_month, base_budget):
+                st.markdown("""
+                <div class="success-alert">
+                    ✅ Planification sauvegardée avec succès!
+                </div>
+                """, unsafe_allow_html=True)
+                st.rerun()
         else:
             st.error("❌ Veuillez définir au moins un budget pour une catégorie")
 
 def add_expense_page():
     st.markdown('<div class="main-header"><h1>💸 Ajouter une Dépense</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
+    user_data = get_user_snapshot()
+    
+    tab1, tab2 = st.tabs(["➕ Nouvelle dépense", "🔁 Dépenses récurrentes"])
+    
+    with tab1:
+        expense_form(user_data)
+    
+    with tab2:
+        recurring_rules(user_data)
+
+def expense_form(user_data):
     current_month = get_current_month_key()
     
-    if current_month not in user_data.get('months', {}):
+    if current_month not in user_data.months:
         st.warning("⚠️ Veuillez d'abord créer une planification pour ce mois dans la section 'Planification mensuelle'.")
         return
     
@@ -363,7 +382,8 @@ def add_expense_page():
     
     with col1:
         category = st.selectbox("🏷️ Catégorie", get_categories())
-        amount = st.number_input("💰 Montant", min_value=0, step=100)
+        expense_currency = currency_selectbox("💱 Devise", user_data.currency, key="expense_currency")
+        amount = amount_input("💰 Montant", expense_currency)
     
     with col2:
         description = st.text_area("📝 Description", height=100)
@@ -373,40 +393,93 @@ def add_expense_page():
     
     if st.button("➕ Ajouter la dépense", use_container_width=True):
         if amount > 0 and description.strip():
-            month_data = user_data['months'][current_month]
-            
-            if 'expenses' not in month_data:
-                month_data['expenses'] = {}
-            if 'expense_details' not in month_data:
-                month_data['expense_details'] = []
-            
-            if category not in month_data['expenses']:
-                month_data['expenses'][category] = 0
-            
-            month_data['expenses'][category] += amount
-            month_data['expense_details'].append({
-                'category': category,
-                'amount': amount,
-                'description': description,
-                'date': expense_date.isoformat(),
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            budget_manager.update_user_data(st.session_state.username, user_data)
+            expense = Expense(
+                category=category,
+                amount=amount,
+                description=description,
+                date=expense_date.isoformat(),
+                timestamp=datetime.now().isoformat(),
+                currency=expense_currency
+            )
             
-            st.markdown("""
-            <div class="success-alert">
-                ✅ Dépense ajoutée avec succès!
-            </div>
-            """, unsafe_allow_html=True)
-            st.rerun()
+            if commit(budget_manager.add_expense, current_month, expense):
+                st.markdown("""
+                <div class="success-alert">
+                    ✅ Dépense ajoutée avec succès!
+                </div>
+                """, unsafe_allow_html=True)
+                st.rerun()
         else:
             st.error("❌ Veuillez remplir tous les champs avec des valeurs valides")
 
+def recurring_rules(user_data):
+    st.markdown("### 🔁 Dépenses Récurrentes")
+    st.caption("Loyer, factures, abonnements... ajoutés automatiquement à chaque échéance.")
+    
+    with st.expander("➕ Nouvelle dépense récurrente", expanded=not user_data.recurring):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            categories = get_categories()
+            rule_category = st.selectbox("🏷️ Catégorie", categories, index=categories.index("Factures"), key="rule_category")
+            rule_currency = currency_selectbox("💱 Devise", user_data.currency, key="rule_currency")
+            rule_amount = amount_input("💰 Montant", rule_currency, key="rule_amount")
+            rule_description = st.text_input("📝 Description", key="rule_description")
+        
+        with col2:
+            frequency = st.selectbox("🔁 Fréquence", list(FREQUENCIES), format_func=FREQUENCIES.get, key="rule_frequency")
+            interval_days = 0
+            if frequency == 'custom':
+                interval_days = st.number_input("📆 Tous les N jours", min_value=1, value=14, key="rule_interval")
+            start_date = st.date_input("📅 Première échéance", value=date.today(), key="rule_start")
+            end_date = st.date_input("🏁 Dernière échéance (facultatif)", value=None, key="rule_end")
+        
+        if st.button("🔁 Créer la dépense récurrente", use_container_width=True):
+            if rule_amount > 0 and rule_description.strip():
+                rule = new_rule(
+                    rule_category,
+                    rule_amount,
+                    frequency,
+                    start_date.isoformat(),
+                    rule_currency,
+                    description=rule_description,
+                    interval_days=interval_days,
+                    end_date=end_date.isoformat() if end_date else ""
+                )
+                if commit(budget_manager.add_recurring_rule, rule):
+                    st.success("✅ Dépense récurrente créée!")
+                    st.rerun()
+            else:
+                st.error("❌ Veuillez remplir tous les champs avec des valeurs valides")
+    
+    if not user_data.recurring:
+        st.info("ℹ️ Aucune dépense récurrente pour le moment.")
+    
+    for rule in user_data.recurring:
+        frequency = FREQUENCIES[rule.frequency]
+        if rule.frequency == 'custom':
+            frequency = f"tous les {rule.interval_days} jours"
+        end = f" jusqu'au {rule.end_date}" if rule.end_date else ""
+        
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"""
+            <div style="background: white; padding: 1rem; margin: 0.5rem 0; border-radius: 8px; border-left: 4px solid #667eea;">
+                <strong>{rule.description}</strong> - {format_amount(rule.amount, rule.currency)}<br>
+                <small>{rule.category} • {frequency} • depuis le {rule.start_date}{end}</small>
+            </div>
+            """, unsafe_allow_html=True)
+        with col2:
+            if st.button("🗑️ Supprimer", key=f"delete_rule_{rule.id}"):
+                if commit(budget_manager.remove_recurring_rule, rule.id):
+                    st.rerun()
+
 def manage_income_page():
     st.markdown('<div class="main-header"><h1>💰 Gérer les Entrées d\'Argent</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
+    user_data = get_user_snapshot()
+    currency = user_data.currency
+    savings = to_display(user_data.savings, currency)
     
     col1, col2 = st.columns([1, 2])
     
@@ -414,7 +487,7 @@ def manage_income_page():
         st.markdown(f"""
         <div class="metric-card">
             <h3 style="color: #28a745; margin: 0;">💰 Petit Coffre</h3>
-            <h2 style="margin: 0;">{user_data.get('savings', 0):,.0f} FCFA</h2>
+            <h2 style="margin: 0;">{format_amount(savings, currency)}</h2>
         </div>
         """, unsafe_allow_html=True)
     
@@ -425,14 +498,12 @@ def manage_income_page():
     with tab1:
         st.markdown('<div class="expense-form">', unsafe_allow_html=True)
         
-        income_amount = st.number_input("💰 Montant de l'entrée", min_value=0, step=1000)
+        income_currency = currency_selectbox("💱 Devise", currency, key="income_currency")
+        income_amount = amount_input("💰 Montant de l'entrée", income_currency, step=1000 if income_currency == BASE_CURRENCY else 10)
         income_description = st.text_input("📝 Description de l'entrée")
         
         if st.button("💰 Ajouter au petit coffre"):
-            if income_amount > 0:
-                user_data['savings'] = user_data.get('savings', 0) + income_amount
-                budget_manager.update_user_data(st.session_state.username, user_data)
-                
+            if income_amount > 0 and commit(budget_manager.add_income, income_amount, income_description, income_currency):
                 st.markdown("""
                 <div class="success-alert">
                     ✅ Entrée ajoutée au petit coffre!
@@ -444,7 +515,7 @@ def manage_income_page():
     
     with tab2:
         current_month = get_current_month_key()
-        if current_month in user_data.get('months', {}) and user_data.get('savings', 0) > 0:
+        if current_month in user_data.months and user_data.savings > 0:
             st.markdown('<div class="expense-form">', unsafe_allow_html=True)
             
             st.markdown("### 📊 Répartir l'argent du petit coffre")
@@ -454,37 +525,33 @@ def manage_income_page():
             total_allocation = 0
             
             for category in categories:
-                allocation[category] = st.number_input(
+                allocation[category] = amount_input(
                     f"💰 Ajouter à {category}",
-                    min_value=0,
-                    max_value=user_data.get('savings', 0),
-                    step=1000,
+                    currency,
+                    max_value=savings,
+                    step=1000 if currency == BASE_CURRENCY else 10,
                     key=f"alloc_{category}"
                 )
                 total_allocation += allocation[category]
             
-            st.markdown(f"**💎 Total à répartir: {total_allocation:,.0f} FCFA**")
-            st.markdown(f"**💰 Reste dans le coffre: {user_data.get('savings', 0) - total_allocation:,.0f} FCFA**")
+            st.markdown(f"**💎 Total à répartir: {format_amount(total_allocation, currency)}**")
+            st.markdown(f"**💰 Reste dans le coffre: {format_amount(savings - total_allocation, currency)}**")
             
             if st.button("✅ Confirmer la répartition"):
-                if total_allocation <= user_data.get('savings', 0):
-                    month_data = user_data['months'][current_month]
-                    
-                    for category, amount in allocation.items():
-                        if amount > 0:
-                            if category not in month_data['budget']:
-                                month_data['budget'][category] = 0
-                            month_data['budget'][category] += amount
-                    
-                    user_data['savings'] -= total_allocation
-                    budget_manager.update_user_data(st.session_state.username, user_data)
-                    
-                    st.markdown("""
-                    <div class="success-alert">
-                        ✅ Répartition effectuée avec succès!
-                    </div>
-                    """, unsafe_allow_html=True)
-                    st.rerun()
+                if total_allocation <= savings:
+                    # Retour en devise de base, sans dépasser le coffre à cause des arrondis
+                    rate = budget_manager.rates.rates_at(currency, [date.today().isoformat()])[0]
+                    base_allocation = {c: round(amount * rate) for c, amount in allocation.items()}
+                    if sum(base_allocation.values()) > user_data.savings:
+                        largest = max(base_allocation, key=base_allocation.get)
+                        base_allocation[largest] -= sum(base_allocation.values()) - user_data.savings
+                    if commit(budget_manager.allocate_savings, current_month, base_allocation):
+                        st.markdown("""
+                        <div class="success-alert">
+                            ✅ Répartition effectuée avec succès!
+                        </div>
+                        """, unsafe_allow_html=True)
+                        st.rerun()
                 else:
                     st.error("❌ Le montant total dépasse le montant disponible dans le coffre")
             
@@ -495,17 +562,22 @@ def manage_income_page():
 def monthly_tracking_page():
     st.markdown('<div class="main-header"><h1>📈 Suivi du Mois Actuel</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
     current_month = get_current_month_key()
+    ensure_recurring(current_month)
+    user_data = get_user_snapshot()
     month_name = datetime.now().strftime("%B %Y")
     
-    if current_month not in user_data.get('months', {}):
+    if current_month not in user_data.months:
         st.warning("⚠️ Aucune planification trouvée pour ce mois. Créez d'abord votre planification mensuelle.")
         return
     
-    month_data = user_data['months'][current_month]
-    budget = month_data.get('budget', {})
-    expenses = month_data.get('expenses', {})
+    month_data = user_data.months[current_month]
+    currency = user_data.currency
+    rates = budget_manager.rates
+    budget, expenses = month_totals(current_month, month_data, rates, currency)
+    # Occurrences récurrentes restant à venir ce mois-ci : dépenses déjà engagées
+    _, upcoming_expenses = pending_occurrences(user_data, current_month, date.today().isoformat())
+    upcoming = totals_by_category(upcoming_expenses, rates, currency)
     
     st.markdown(f"### 📅 Suivi pour {month_name}")
     
@@ -517,6 +589,18 @@ def monthly_tracking_page():
         if budgeted > 0 and spent > budgeted:
             overbudget_categories.append(category)
     
+    # Prévision de fin de mois à partir du rythme journalier et de l'historique
+    forecast = forecast_user(user_data, current_month, datetime.now().day, get_categories(), rates)
+    for category in forecast:
+        committed = expenses.get(category, 0) + upcoming.get(category, 0)
+        forecast[category] = max(forecast[category], committed)
+    forecast_overbudget = [
+        category for category in get_categories()
+        if category not in overbudget_categories
+        and budget.get(category, 0) > 0
+        and forecast[category] > budget.get(category, 0)
+    ]
+    
     # Affichage de l'alerte si dépassement
     if overbudget_categories:
         categories_str = ", ".join(overbudget_categories)
@@ -526,6 +610,16 @@ def monthly_tracking_page():
         </div>
         """, unsafe_allow_html=True)
     
+    if forecast_overbudget:
+        categories_str = ", ".join(
+            f"{category} (~{format_amount(forecast[category], currency)})" for category in forecast_overbudget
+        )
+        st.markdown(f"""
+        <div class="warning-alert">
+            🔮 <strong>Prévision :</strong> Au rythme actuel et avec les dépenses récurrentes à venir, le budget sera dépassé en fin de mois pour : {categories_str}.
+        </div>
+        """, unsafe_allow_html=True)
+    
     # Tableau de suivi
     tracking_data = []
     for category in get_categories():
@@ -551,19 +645,18 @@ def monthly_tracking_page():
         
         tracking_data.append({
             'Catégorie': category,
-            'Budget': f"{budgeted:,.0f} FCFA",
-            'Dépensé': f"{spent:,.0f} FCFA",
-            'Reste': f"{remaining:,.0f} FCFA",
+            'Budget': format_amount(budgeted, currency),
+            'Dépensé': format_amount(spent, currency),
+            'Reste': format_amount(remaining, currency),
             'Status': status
         })
     
     # Affichage sous forme de cartes
     for data in tracking_data:
-        if data['Budget'] != "0 FCFA":  # N'afficher que les catégories avec budget
-            category = data['Catégorie']
+        category = data['Catégorie']
+        if budget.get(category, 0) > 0:  # N'afficher que les catégories avec budget
             budgeted = budget.get(category, 0)
             spent = expenses.get(category, 0)
-            remaining = budgeted - spent
             
             progress = min((spent / budgeted) * 100, 100) if budgeted > 0 else 0
             
@@ -575,45 +668,68 @@ def monthly_tracking_page():
             else:
                 color = "#ffc107"  # Jaune pour approche de la limite
             
+            forecast_color = "#dc3545" if forecast[category] > budgeted else "#6c757d"
+            
+            upcoming_line = ""
+            if upcoming.get(category):
+                committed = spent + upcoming[category]
+                committed_color = "#dc3545" if committed > budgeted else "#6c757d"
+                upcoming_line = (
+                    f'<div style="text-align: center; color: {committed_color};">🔁 Récurrent à venir : '
+                    f'{format_amount(upcoming[category], currency)} (engagé : {format_amount(committed, currency)})</div>'
+                )
+            
             st.markdown(f"""
             <div class="budget-card">
                 <h3 style="margin: 0; color: #343a40;">💰 {category}</h3>
                 <div style="display: flex; justify-content: space-between; margin: 1rem 0;">
-                    <span><strong>Budget:</strong> {budgeted:,.0f} FCFA</span>
-                    <span><strong>Dépensé:</strong> {spent:,.0f} FCFA</span>
-                    <span><strong>Reste:</strong> <span style="color: {color};">{remaining:,.0f} FCFA</span></span>
+                    <span><strong>Budget:</strong> {data['Budget']}</span>
+                    <span><strong>Dépensé:</strong> {data['Dépensé']}</span>
+                    <span><strong>Reste:</strong> <span style="color: {color};">{data['Reste']}</span></span>
                 </div>
                 <div style="background: #e9ecef; border-radius: 10px; height: 10px; margin: 1rem 0;">
                     <div style="background: {color}; height: 100%; width: {min(progress, 100)}%; border-radius: 10px; transition: width 0.3s;"></div>
                 </div>
                 <div style="text-align: center; font-weight: bold; color: {color};">{progress:.1f}%</div>
+                <div style="text-align: center; color: {forecast_color};">🔮 Prévision fin de mois : {format_amount(forecast[category], currency)}</div>
+                {upcoming_line}
             </div>
             """, unsafe_allow_html=True)
     
     # Historique des dépenses récentes
-    if month_data.get('expense_details'):
+    if month_data.expense_details:
         st.markdown("---")
         st.markdown("### 📋 Dépenses Récentes")
         
         recent_expenses = sorted(
-            month_data['expense_details'],
-            key=lambda x: x['timestamp'],
+            month_data.expense_details,
+            key=lambda x: x.timestamp,
             reverse=True
         )[:10]
         
         for expense in recent_expenses:
             st.markdown(f"""
             <div style="background: white; padding: 1rem; margin: 0.5rem 0; border-radius: 8px; border-left: 4px solid #667eea;">
-                <strong>{expense['category']}</strong> - {expense['amount']:,.0f} FCFA<br>
-                <small>{expense['description']} • {expense['date']}</small>
+                <strong>{expense.category}</strong> - {format_amount(expense.amount, expense.currency)}<br>
+                <small>{expense.description} • {expense.date}</small>
             </div>
             """, unsafe_allow_html=True)
 
 def history_page():
     st.markdown('<div class="main-header"><h1>📚 Historique des Mois</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
-    months = user_data.get('months', {})
+    user_data = get_user_snapshot()
+    
+    tab1, tab2 = st.tabs(["📅 Mois", "💰 Petit Coffre"])
+    
+    with tab1:
+        month_history(user_data)
+    
+    with tab2:
+        savings_timeline(user_data)
+
+def month_history(user_data):
+    months = user_data.months
     
     if not months:
         st.info("ℹ️ Aucun historique disponible. Commencez par créer votre première planification mensuelle.")
@@ -636,9 +752,13 @@ def history_page():
     selected_month_name = st.selectbox("📅 Choisir un mois", list(month_options.keys()))
     selected_month = month_options[selected_month_name]
     
+    updated = ensure_recurring(selected_month)
+    if updated is not None:
+        months = updated.months
     month_data = months[selected_month]
-    budget = month_data.get('budget', {})
-    expenses = month_data.get('expenses', {})
+    currency = user_data.currency
+    rates = budget_manager.rates
+    budget, expenses = month_totals(selected_month, month_data, rates, currency)
     
     # Résumé du mois
     total_budget = sum(budget.values())
@@ -651,17 +771,17 @@ def history_page():
         st.markdown("""
         <div class="metric-card">
             <h4 style="color: #667eea; margin: 0;">Budget Alloué</h4>
-            <h3 style="margin: 0;">{:,.0f} FCFA</h3>
+            <h3 style="margin: 0;">{}</h3>
         </div>
-        """.format(total_budget), unsafe_allow_html=True)
+        """.format(format_amount(total_budget, currency)), unsafe_allow_html=True)
     
     with col2:
         st.markdown("""
         <div class="metric-card">
             <h4 style="color: #ffc107; margin: 0;">Dépenses Réalisées</h4>
-            <h3 style="margin: 0;">{:,.0f} FCFA</h3>
+            <h3 style="margin: 0;">{}</h3>
         </div>
-        """.format(total_spent), unsafe_allow_html=True)
+        """.format(format_amount(total_spent, currency)), unsafe_allow_html=True)
     
     with col3:
         color = "#28a745" if difference >= 0 else "#dc3545"
@@ -669,9 +789,9 @@ def history_page():
         st.markdown("""
         <div class="metric-card">
             <h4 style="color: {}; margin: 0;">{}</h4>
-            <h3 style="margin: 0; color: {}">{:,.0f} FCFA</h3>
+            <h3 style="margin: 0; color: {}">{}</h3>
         </div>
-        """.format(color, label, color, abs(difference)), unsafe_allow_html=True)
+        """.format(color, label, color, format_amount(abs(difference), currency)), unsafe_allow_html=True)
     
     with col4:
         percentage = (total_spent / total_budget * 100) if total_budget > 0 else 0
@@ -720,42 +840,137 @@ def history_page():
             st.plotly_chart(fig, use_container_width=True)
     
     # Détail des transactions
-    if month_data.get('expense_details'):
+    if month_data.expense_details:
         st.markdown("---")
         st.markdown("### 📋 Détail des Transactions")
         
-        expense_details = month_data['expense_details']
-        df = pd.DataFrame(expense_details)
+        expense_details = month_data.expense_details
+        df = pd.DataFrame(to_builtins(expense_details))
         
         if not df.empty:
             df['date'] = pd.to_datetime(df['date'])
             df = df.sort_values('date', ascending=False)
+            # Conversion vectorisée de toute la colonne dans la devise d'affichage
+            df['converted'] = rates.convert(df['amount'], df['currency'], df['date'].values.astype('datetime64[D]'), currency)
             
             st.dataframe(
-                df[['date', 'category', 'amount', 'description']].rename(columns={
+                df[['date', 'category', 'amount', 'currency', 'converted', 'description']].rename(columns={
                     'date': 'Date',
                     'category': 'Catégorie',
-                    'amount': 'Montant (FCFA)',
+                    'amount': 'Montant',
+                    'currency': 'Devise',
+                    'converted': f"Montant ({currency_label(currency)})",
                     'description': 'Description'
                 }),
                 use_container_width=True
             )
 
+def savings_timeline(user_data):
+    currency = user_data.currency
+    rates = budget_manager.rates
+    entries = budget_manager.ledger.history(st.session_state.username)
+    
+    if not entries:
+        st.info("ℹ️ Aucun mouvement enregistré dans le petit coffre.")
+        return
+    
+    # Journal mis en colonnes, puis converti en une seule fois dans la devise d'affichage
+    df = pd.DataFrame({
+        'timestamp': pd.to_datetime([e.timestamp for e in entries]),
+        'kind': [ENTRY_KINDS.get(e.kind, e.kind) for e in entries],
+        'amount': [e.amount for e in entries],
+        'description': [e.description or e.month_key for e in entries]
+    })
+    df['balance'] = df['amount'].cumsum()
+    dates = df['timestamp'].values.astype('datetime64[D]')
+    base = [BASE_CURRENCY] * len(df)
+    df['amount'] = rates.convert(df['amount'], base, dates, currency)
+    df['balance'] = rates.convert(df['balance'], base, dates, currency)
+    
+    incomes = df.loc[df['amount'] > 0, 'amount'].sum()
+    outflows = -df.loc[df['amount'] < 0, 'amount'].sum()
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown("""
+        <div class="metric-card">
+            <h4 style="color: #667eea; margin: 0;">📒 Mouvements</h4>
+            <h3 style="margin: 0;">{:,}</h3>
+        </div>
+        """.format(len(df)), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown("""
+        <div class="metric-card">
+            <h4 style="color: #28a745; margin: 0;">💰 Total des Entrées</h4>
+            <h3 style="margin: 0;">{}</h3>
+        </div>
+        """.format(format_amount(incomes, currency)), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown("""
+        <div class="metric-card">
+            <h4 style="color: #ffc107; margin: 0;">📊 Total Réparti ou Retiré</h4>
+            <h3 style="margin: 0;">{}</h3>
+        </div>
+        """.format(format_amount(outflows, currency)), unsafe_allow_html=True)
+    
+    balance = df.set_index('timestamp')['balance']
+    fig = go.Figure(make_trace(balance, 'Solde', '#28a745'))
+    fig.update_layout(
+        title="Évolution du Petit Coffre",
+        xaxis_title="Date",
+        yaxis_title=f"Solde ({currency_label(currency)})",
+        height=400
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Solde à une date : point de reprise le plus proche puis rejeu de la fin du journal
+    selected_date = st.date_input("📅 Solde du petit coffre au", value=date.today())
+    balance_at = budget_manager.ledger.balance_at(
+        st.session_state.username, f"{selected_date.isoformat()}T23:59:59.999999"
+    )
+    st.info(f"💰 Solde au {selected_date.strftime('%d/%m/%Y')} : "
+            f"{format_amount(to_display(balance_at, currency, selected_date.isoformat()), currency)}")
+    
+    st.markdown("### 📋 Derniers Mouvements")
+    st.dataframe(
+        df.iloc[::-1].head(50).rename(columns={
+            'timestamp': 'Date',
+            'kind': 'Type',
+            'amount': f"Montant ({currency_label(currency)})",
+            'balance': f"Solde ({currency_label(currency)})",
+            'description': 'Description'
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
 def settings_page():
     st.markdown('<div class="main-header"><h1>⚙️ Paramètres</h1></div>', unsafe_allow_html=True)
     
-    user_data = budget_manager.get_user_data(st.session_state.username)
+    user_data = get_user_snapshot()
+    currency = user_data.currency
+    rates = budget_manager.rates
     
     tab1, tab2, tab3 = st.tabs(["👤 Profil", "🔄 Gestion des Données", "📊 Statistiques"])
     
     with tab1:
         st.markdown("### 👤 Informations du Profil")
         st.info(f"👤 Utilisateur: {st.session_state.username}")
-        st.info(f"💰 Petit Coffre: {user_data.get('savings', 0):,.0f} FCFA")
+        st.info(f"💰 Petit Coffre: {format_amount(to_display(user_data.savings, currency), currency)}")
         
-        months_count = len(user_data.get('months', {}))
+        months_count = len(user_data.months)
         st.info(f"📅 Nombre de mois gérés: {months_count}")
         
+        selected_currency = currency_selectbox("💱 Devise d'affichage", currency, key="display_currency")
+        st.caption(f"Taux de change : version {rates.version}")
+        if selected_currency != currency and st.button("💱 Changer la devise d'affichage"):
+            if commit(budget_manager.set_currency, selected_currency):
+                st.success("✅ Devise d'affichage mise à jour!")
+                st.rerun()
+        
         if st.button("🔄 Changer de mot de passe"):
             st.info("Cette fonctionnalité sera disponible dans une prochaine version.")
     
@@ -766,7 +981,7 @@ def settings_page():
         
         with col1:
             if st.button("📥 Exporter les données", use_container_width=True):
-                data_json = json.dumps(user_data, indent=2, ensure_ascii=False)
+                data_json = encode_user(user_data)
                 st.download_button(
                     label="💾 Télécharger le fichier JSON",
                     data=data_json,
@@ -777,42 +992,59 @@ def settings_page():
         with col2:
             if st.button("🗑️ Réinitialiser le petit coffre", use_container_width=True):
                 if st.session_state.get('confirm_reset_savings'):
-                    user_data['savings'] = 0
-                    budget_manager.update_user_data(st.session_state.username, user_data)
                     st.session_state['confirm_reset_savings'] = False
-                    st.success("✅ Petit coffre réinitialisé!")
-                    st.rerun()
+                    if commit(budget_manager.reset_savings):
+                        st.success("✅ Petit coffre réinitialisé!")
+                        st.rerun()
                 else:
                     st.session_state['confirm_reset_savings'] = True
                     st.warning("⚠️ Cliquez à nouveau pour confirmer")
         
+        st.markdown("---")
+        st.markdown("#### ♻️ Restaurer une sauvegarde")
+        
+        snapshot_times = list_snapshots(budget_manager)
+        if snapshot_times:
+            snapshot_options = {t.strftime("%d/%m/%Y %H:%M:%S"): t for t in reversed(snapshot_times)}
+            selected_snapshot = st.selectbox("📅 Choisir un instantané", list(snapshot_options.keys()))
+            
+            if st.button("♻️ Restaurer mes données à cette date"):
+                try:
+                    restore(budget_manager, snapshot_options[selected_snapshot], st.session_state.username)
+                    st.success("✅ Données restaurées!")
+                    st.rerun()
+                except SnapshotError as e:
+                    st.error(f"❌ {e}")
+        else:
+            st.info("ℹ️ Aucun instantané disponible pour le moment.")
+        
         st.markdown("---")
         st.markdown("#### 🗑️ Zone Dangereuse")
         
         if st.button("💥 Supprimer toutes les données", type="secondary"):
             if st.session_state.get('confirm_delete_all'):
-                user_data = {'months': {}, 'savings': 0}
-                budget_manager.update_user_data(st.session_state.username, user_data)
+                # Un instantané est pris avant la suppression pour pouvoir la restaurer
+                take_snapshot(budget_manager, [st.session_state.username])
                 st.session_state['confirm_delete_all'] = False
-                st.success("✅ Toutes les données ont été supprimées!")
-                st.rerun()
+                if commit(budget_manager.reset_user):
+                    st.success("✅ Toutes les données ont été supprimées! Un instantané a été conservé.")
+                    st.rerun()
             else:
                 st.session_state['confirm_delete_all'] = True
-                st.error("⚠️ ATTENTION: Cette action est irréversible! Cliquez à nouveau pour confirmer.")
+                st.error("⚠️ ATTENTION: Toutes vos données seront supprimées! Un instantané est conservé pour les restaurer ci-dessus. Cliquez à nouveau pour confirmer.")
     
     with tab3:
         st.markdown("### 📊 Statistiques Générales")
         
-        months = user_data.get('months', {})
+        months = user_data.months
         if months:
             # Calcul des statistiques
             total_months = len(months)
             total_budgets = []
             total_expenses = []
             
-            for month_data in months.values():
-                budget = month_data.get('budget', {})
-                expenses = month_data.get('expenses', {})
+            for month_key, month_data in months.items():
+                budget, expenses = month_totals(month_key, month_data, rates, currency)
                 total_budgets.append(sum(budget.values()))
                 total_expenses.append(sum(expenses.values()))
             
@@ -833,72 +1065,189 @@ def settings_page():
                 st.markdown("""
                 <div class="metric-card">
                     <h4 style="color: #28a745; margin: 0;">💰 Budget Moyen</h4>
-                    <h3 style="margin: 0;">{:,.0f} FCFA</h3>
+                    <h3 style="margin: 0;">{}</h3>
                 </div>
-                """.format(avg_budget), unsafe_allow_html=True)
+                """.format(format_amount(avg_budget, currency)), unsafe_allow_html=True)
             
             with col2:
                 st.markdown("""
                 <div class="metric-card">
                     <h4 style="color: #ffc107; margin: 0;">💸 Dépenses Moyennes</h4>
-                    <h3 style="margin: 0;">{:,.0f} FCFA</h3>
+                    <h3 style="margin: 0;">{}</h3>
                 </div>
-                """.format(avg_expenses), unsafe_allow_html=True)
+                """.format(format_amount(avg_expenses, currency)), unsafe_allow_html=True)
                 
                 color = "#28a745" if total_savings >= 0 else "#dc3545"
                 st.markdown("""
                 <div class="metric-card">
                     <h4 style="color: {}; margin: 0;">💎 Économies Totales</h4>
-                    <h3 style="margin: 0; color: {}">{:,.0f} FCFA</h3>
+                    <h3 style="margin: 0; color: {}">{}</h3>
                 </div>
-                """.format(color, color, total_savings), unsafe_allow_html=True)
+                """.format(color, color, format_amount(total_savings, currency)), unsafe_allow_html=True)
             
             # Graphique d'évolution
             if len(months) > 1:
-                months_sorted = sorted(months.items())
-                month_names = []
-                budgets = []
-                expenses = []
+                budgets = {}
+                expenses = {}
                 
-                for month_key, month_data in months_sorted:
+                for month_key, month_data in months.items():
                     try:
                         month_date = datetime.strptime(month_key, "%Y-%m")
-                        month_names.append(month_date.strftime("%b %Y"))
-                        budgets.append(sum(month_data.get('budget', {}).values()))
-                        expenses.append(sum(month_data.get('expenses', {}).values()))
+                        month_budget, month_expenses = month_totals(month_key, month_data, rates, currency)
+                        budgets[month_date] = sum(month_budget.values())
+                        expenses[month_date] = sum(month_expenses.values())
                     except:
                         continue
                 
-                if month_names:
+                if budgets:
                     fig = go.Figure()
-                    
-                    fig.add_trace(go.Scatter(
-                        x=month_names,
-                        y=budgets,
-                        mode='lines+markers',
-                        name='Budget',
-                        line=dict(color='#667eea', width=3)
-                    ))
-                    
-                    fig.add_trace(go.Scatter(
-                        x=month_names,
-                        y=expenses,
-                        mode='lines+markers',
-                        name='Dépenses',
-                        line=dict(color='#ffc107', width=3)
-                    ))
+                    fig.add_trace(make_trace(pd.Series(budgets).sort_index(), 'Budget', '#667eea'))
+                    fig.add_trace(make_trace(pd.Series(expenses).sort_index(), 'Dépenses', '#ffc107'))
                     
                     fig.update_layout(
                         title="Évolution Budget vs Dépenses",
                         xaxis_title="Mois",
-                        yaxis_title="Montant (FCFA)",
+                        yaxis_title=f"Montant ({currency_label(currency)})",
                         height=400
                     )
                     
                     st.plotly_chart(fig, use_container_width=True)
+            
+            # Tendance des dépenses, agrégée selon la période choisie
+            daily_spending = build_daily_spending(months, rates, currency)
+            if not daily_spending.empty:
+                st.markdown("---")
+                st.markdown("### 📉 Tendance des Dépenses")
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    period = st.radio(
+                        "📅 Période",
+                        ["3 mois", "1 an", "Tout l'historique"],
+                        index=1,
+                        horizontal=True
+                    )
+                with col2:
+                    resolution_choice = st.radio(
+                        "🔍 Résolution",
+                        ["Auto"] + [label for _, label in RESOLUTIONS.values()],
+                        horizontal=True
+                    )
+                
+                end = daily_spending.index.max()
+                if period == "3 mois":
+                    daily_spending = daily_spending[daily_spending.index > end - pd.DateOffset(months=3)]
+                elif period == "1 an":
+                    daily_spending = daily_spending[daily_spending.index > end - pd.DateOffset(years=1)]
+                
+                if resolution_choice == "Auto":
+                    resolution = choose_resolution(daily_spending.index.min(), end)
+                else:
+                    resolution = next(key for key, (_, label) in RESOLUTIONS.items() if label == resolution_choice)
+                
+                series = aggregate(daily_spending, resolution)
+                trace = make_trace(series, 'Dépenses', '#ffc107', fill='tozeroy')
+                
+                fig = go.Figure(trace)
+                fig.update_layout(
+                    title=f"Dépenses par {RESOLUTIONS[resolution][1].lower()}",
+                    xaxis_title="Date",
+                    yaxis_title=f"Montant ({currency_label(currency)})",
+                    height=400
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(f"{len(trace.x):,} points affichés sur {len(series):,} périodes")
         else:
             st.info("ℹ️ Aucune donnée disponible pour les statistiques.")
 
+@st.cache_data(show_spinner=False)
+def load_admin_report(data_file, data_mtime):
+    # data_mtime invalide le cache dès que le fichier de données change
+    return build_report(data_file)
+
+def admin_page():
+    st.markdown('<div class="main-header"><h1>🛠️ Administration</h1></div>', unsafe_allow_html=True)
+    
+    if not is_admin(st.session_state.username):
+        st.error("❌ Accès réservé aux administrateurs")
+        return
+    
+    if not os.path.exists(budget_manager.data_file):
+        st.info("ℹ️ Aucune donnée disponible.")
+        return
+    
+    with st.spinner("Calcul du rapport..."):
+        category_report, month_report = load_admin_report(
+            budget_manager.data_file,
+            os.path.getmtime(budget_manager.data_file)
+        )
+    
+    if month_report.empty:
+        st.info("ℹ️ Aucune donnée disponible.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown("""
+        <div class="metric-card">
+            <h4 style="color: #667eea; margin: 0;">👥 Utilisateurs</h4>
+            <h3 style="margin: 0;">{}</h3>
+        </div>
+        """.format(len(budget_manager.data)), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown("""
+        <div class="metric-card">
+            <h4 style="color: #ffc107; margin: 0;">💸 Dépenses Totales</h4>
+            <h3 style="margin: 0;">{}</h3>
+        </div>
+        """.format(format_amount(month_report['spent'].sum(), BASE_CURRENCY)), unsafe_allow_html=True)
+    
+    with col3:
+        overbudget_rate = month_report['overbudget_users'].sum() / month_report['users'].sum() * 100
+        st.markdown("""
+        <div class="metric-card">
+            <h4 style="color: #dc3545; margin: 0;">🚨 Mois en Dépassement</h4>
+            <h3 style="margin: 0;">{:.1f}%</h3>
+        </div>
+        """.format(overbudget_rate), unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        spent_by_category = category_report.groupby('category', as_index=False)['spent'].sum()
+        fig = px.bar(
+            spent_by_category,
+            x='category',
+            y='spent',
+            title="Dépenses Totales par Catégorie",
+            color_discrete_sequence=['#667eea']
+        )
+        fig.update_layout(height=400, xaxis_title="Catégorie", yaxis_title="Montant (FCFA)")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        fig = px.line(
+            month_report,
+            x='month',
+            y=month_report['overbudget_rate'] * 100,
+            title="Taux de Dépassement par Mois",
+            markers=True
+        )
+        fig.update_layout(height=400, xaxis_title="Mois", yaxis_title="Utilisateurs en dépassement (%)")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.markdown("### 📋 Détail par Mois et Catégorie")
+    st.dataframe(category_report, use_container_width=True)
+    
+    st.download_button(
+        label="💾 Télécharger le rapport (CSV)",
+        data=category_report.to_csv(index=False),
+        file_name=f"rapport_categories_{datetime.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv"
+    )
+
 # Fonction principale
 def main():
     if 'logged_in' not in st.session_state:
@@ -923,9 +1272,22 @@ def main():
             history_page()
         elif page == "settings":
             settings_page()
+        elif page == "admin":
+            admin_page()
+
+# Initialisation du gestionnaire de budget, partagé par toutes les sessions
+@st.cache_resource
+def get_budget_manager():
+    # BUDGET_TRACE_FILE active l'enregistrement des mutations (voir tracing.py)
+    return BudgetManager(trace_file=os.environ.get("BUDGET_TRACE_FILE"))
+
+@st.cache_resource
+def get_dashboard_views():
+    return DashboardViews(get_budget_manager(), get_current_month_key)
 
-# Initialisation du gestionnaire de budget
-budget_manager = BudgetManager()
+budget_manager = get_budget_manager()
+budget_manager.refresh_if_changed()
+dashboard_views = get_dashboard_views()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from schema import BASE_CURRENCY
+
+# Symbole et nombre de décimales affichées par devise
+CURRENCIES = {
+    'XOF': ("FCFA", 0),
+    'EUR': ("€", 2),
+    'USD': ("$", 2)
+}
+
+# Table utilisée tant qu'aucun fichier de taux n'est présent
+DEFAULT_RATES = {
+    'version': "defaut",
+    'rates': {
+        'EUR': [["1999-01-01", 655.957]],
+        'USD': [["2025-01-01", 630.0]]
+    }
+}
+
+
+class CurrencyError(ValueError):
+    pass
+
+
+def format_amount(value, currency=BASE_CURRENCY):
+    symbol, decimals = CURRENCIES.get(currency, (currency, 2))
+    return f"{value:,.{decimals}f} {symbol}"
+
+
+def currency_label(currency):
+    return CURRENCIES.get(currency, (currency, 2))[0]
+
+
+class RateTable:
+    # Taux datés exprimés en unités de la devise de base pour une unité de devise ;
+    # un taux s'applique à partir de sa date jusqu'au taux suivant
+    def __init__(self, rates, version):
+        self.version = version
+        self._dates = {}
+        self._values = {}
+        for currency, history in rates.items():
+            history = sorted(history)
+            self._dates[currency] = np.array([d for d, _ in history], dtype='datetime64[D]')
+            self._values[currency] = np.array([r for _, r in history], dtype=float)
+
+    @property
+    def currencies(self):
+        return [BASE_CURRENCY] + sorted(c for c in self._dates if c != BASE_CURRENCY)
+
+    def rates_at(self, currency, dates):
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if currency == BASE_CURRENCY:
+            return np.ones(dates.shape)
+        if currency not in self._dates:
+            raise CurrencyError(f"Devise inconnue : {currency}")
+        # Avant le premier taux, le plus ancien s'applique ; sans date (NaT), le plus récent
+        idx = np.searchsorted(self._dates[currency], dates, side='right') - 1
+        return self._values[currency][np.clip(idx, 0, None)]
+
+    def convert(self, amounts, currencies, dates, target=BASE_CURRENCY):
+        # Une multiplication vectorisée par devise présente, jamais par enregistrement
+        result = np.array(amounts, dtype=float)
+        currencies = np.asarray(currencies)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        for currency in np.unique(currencies):
+            if currency != BASE_CURRENCY:
+                mask = currencies == currency
+                result[mask] *= self.rates_at(currency, dates[mask])
+        if target != BASE_CURRENCY:
+            result /= self.rates_at(target, dates)
+        return result
+
+    def convert_one(self, amount, currency, on, target=BASE_CURRENCY):
+        return float(self.convert([amount], [currency], [on or 'NaT'], target)[0])
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def load_rate_table(path):
+    # Table partagée, relue uniquement quand le fichier change
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        if mtime is None:
+            table = RateTable(DEFAULT_RATES['rates'], DEFAULT_RATES['version'])
+        else:
+            with open(path, 'rb') as f:
+                content = f.read()
+            raw = json.loads(content)
+            # Sans numéro explicite, la version est l'empreinte du contenu
+            version = raw.get('version') or hashlib.sha256(content).hexdigest()[:12]
+            table = RateTable(raw['rates'], str(version))
+        _tables[path] = (mtime, table)
+        return table
+
+
+def expense_columns(expense_details):
+    categories = [e.category for e in expense_details]
+    amounts = [e.amount for e in expense_details]
+    currencies = [e.currency for e in expense_details]
+    dates = [e.date or 'NaT' for e in expense_details]
+    return categories, amounts, currencies, dates
+
+
+def compute_month_totals(month_key, month_data, rates, currency):
+    # Budgets (stockés en devise de base) au taux du premier jour du mois,
+    # dépenses au taux de leur propre date
+    month_rate = rates.rates_at(currency, [f"{month_key}-01"])[0]
+    budget = {c: amount / month_rate for c, amount in month_data.budget.items()}
+
+    if not month_data.expense_details:
+        expenses = {c: amount / month_rate for c, amount in month_data.expenses.items()}
+        return budget, expenses
+
+    return budget, totals_by_category(month_data.expense_details, rates, currency)
+
+
+def totals_by_category(expenses, rates, currency=BASE_CURRENCY):
+    if not expenses:
+        return {}
+    categories, amounts, currencies, dates = expense_columns(expenses)
+    converted = rates.convert(amounts, currencies, dates, currency)
+    names, inverse = np.unique(categories, return_inverse=True)
+    totals = np.bincount(inverse, weights=converted, minlength=len(names))
+    return dict(zip(names.tolist(), totals.tolist()))
+
+
+class MonthTotalsCache:
+    # Totaux convertis par (mois, version de la table, devise). Les mois sont figés
+    # et partagés entre versions d'un utilisateur : un mois inchangé reste en cache.
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, month_key, month_data, rates, currency):
+        key = (id(month_data), month_key, rates.version, currency)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is month_data:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        totals = compute_month_totals(month_key, month_data, rates, currency)
+        with self._lock:
+            # Le mois est gardé en référence : son id ne peut pas être réutilisé
+            self._entries[key] = (month_data, totals)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return totals
+
+
+_month_totals = MonthTotalsCache()
+
+
+def month_totals(month_key, month_data, rates, currency=BASE_CURRENCY):
+    return _month_totals.get(month_key, month_data, rates, currency)
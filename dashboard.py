@@ -0,0 +1,144 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+import plotly.express as px
+
+from currency import month_totals
+from schema import BASE_CURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DashboardView:
+    version: int
+    month_key: str
+    rates_version: str
+    currency: str
+    built_at: datetime
+    build_time: float
+    # Montants convertis dans la devise d'affichage : flottants, arrondis à l'affichage
+    savings: float
+    has_month: bool = False
+    total_budget: float = 0.0
+    total_spent: float = 0.0
+    budget_figure: Optional[dict] = None
+    expenses_figure: Optional[dict] = None
+
+    @property
+    def remaining(self):
+        return self.total_budget - self.total_spent
+
+
+def build_dashboard_view(user_data, month_key, rates):
+    start = time.perf_counter()
+    currency = user_data.currency
+    savings = rates.convert_one(user_data.savings, BASE_CURRENCY, None, currency)
+    month_data = user_data.months.get(month_key)
+    if month_data is None:
+        return DashboardView(
+            version=user_data.version,
+            month_key=month_key,
+            rates_version=rates.version,
+            currency=currency,
+            built_at=datetime.now(),
+            build_time=time.perf_counter() - start,
+            savings=savings
+        )
+
+    budget, expenses = month_totals(month_key, month_data, rates, currency)
+    budget_figure = None
+    if budget:
+        fig = px.pie(
+            values=list(budget.values()),
+            names=list(budget.keys()),
+            title="Répartition du Budget",
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
+        fig.update_layout(showlegend=True, height=400)
+        budget_figure = fig.to_dict()
+
+    expenses_figure = None
+    if expenses:
+        fig = px.bar(
+            x=list(expenses.keys()),
+            y=list(expenses.values()),
+            title="Dépenses par Catégorie",
+            color=list(expenses.values()),
+            color_continuous_scale="RdYlBu_r"
+        )
+        fig.update_layout(showlegend=False, height=400)
+        expenses_figure = fig.to_dict()
+
+    return DashboardView(
+        version=user_data.version,
+        month_key=month_key,
+        rates_version=rates.version,
+        currency=currency,
+        built_at=datetime.now(),
+        build_time=time.perf_counter() - start,
+        savings=savings,
+        has_month=True,
+        total_budget=sum(budget.values()),
+        total_spent=sum(expenses.values()),
+        budget_figure=budget_figure,
+        expenses_figure=expenses_figure
+    )
+
+
+class DashboardViews:
+    # Vues du tableau de bord précalculées par un thread de fond après chaque
+    # écriture ; une vue n'est servie que si elle correspond à la version lue.
+    # Le thread génère aussi les dépenses récurrentes échues du mois courant.
+    def __init__(self, budget_manager, get_month_key):
+        self.budget_manager = budget_manager
+        self.get_month_key = get_month_key
+        self._views = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="dashboard-views", daemon=True)
+        self._worker.start()
+        budget_manager.add_listener(self.schedule)
+
+    def schedule(self, username):
+        with self._lock:
+            if username in self._pending:
+                return
+            self._pending.add(username)
+        self._queue.put(username)
+
+    def get(self, username, version, month_key, rates_version):
+        view = self._views.get(username)
+        if (view is None or view.version != version or view.month_key != month_key
+                or view.rates_version != rates_version):
+            return None
+        return view
+
+    def put(self, username, view):
+        with self._lock:
+            current = self._views.get(username)
+            if current is None or current.version <= view.version:
+                self._views[username] = view
+
+    def _run(self):
+        while True:
+            username = self._queue.get()
+            with self._lock:
+                self._pending.discard(username)
+            try:
+                month_key = self.get_month_key()
+                # Les occurrences récurrentes échues sont générées ici plutôt qu'au rendu de la
+                # page ; une génération notifie l'écouteur, qui reprogramme la vue
+                if self.budget_manager.generate_recurring(username, month_key, date.today().isoformat()) is not None:
+                    continue
+                user_data = self.budget_manager.get_user_data(username)
+                self.put(username, build_dashboard_view(user_data, month_key, self.budget_manager.rates))
+            except Exception:
+                # La page recalculera la vue elle-même
+                logger.exception("Échec du précalcul du tableau de bord de %s", username)
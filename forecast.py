@@ -0,0 +1,185 @@
+import argparse
+import calendar
+import random
+import time
+from itertools import chain, repeat
+
+import numpy as np
+
+from currency import expense_columns
+from schema import BASE_CURRENCY, SCHEMA_VERSION, Expense, MonthData, UserData
+
+CATEGORIES = ["Transport", "Nourriture", "Factures", "Santé", "Divers"]
+HISTORY_MONTHS = 3
+
+
+def days_in_month(month_key):
+    year, month = map(int, month_key.split('-'))
+    return calendar.monthrange(year, month)[1]
+
+
+def previous_month_keys(month_key, count):
+    year, month = map(int, month_key.split('-'))
+    keys = []
+    for _ in range(count):
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        keys.append(f"{year}-{month:02d}")
+    return keys
+
+
+def category_codes(names, categories):
+    # Index de chaque nom dans categories, -1 si inconnu
+    lookup = {c: i for i, c in enumerate(categories)}
+    return np.fromiter(map(lookup.get, names, repeat(-1)), dtype=np.intp, count=len(names))
+
+
+def build_daily_series(users_data, month_key, categories=CATEGORIES, rates=None, currency=BASE_CURRENCY):
+    # Tableau (utilisateurs, catégories, jours) : colonnes extraites en bloc, une
+    # compréhension par champ, puis sommées en un seul np.bincount
+    n_days = days_in_month(month_key)
+    shape = (len(users_data), len(categories), n_days)
+    months = [user_data.months.get(month_key) for user_data in users_data]
+    details = [month_data.expense_details if month_data is not None else () for month_data in months]
+    expenses = list(chain.from_iterable(details))
+    if not expenses:
+        return np.zeros(shape)
+
+    names, amounts, currencies, dates = expense_columns(expenses)
+    user_idx = np.repeat(np.arange(len(users_data)), [len(d) for d in details])
+    cat_idx = category_codes(names, categories)
+    # Les dates hors du mois, ou absentes, sont ramenées à son premier ou dernier jour
+    offsets = np.array(dates, dtype='datetime64[D]') - np.datetime64(f"{month_key}-01")
+    day_idx = np.clip(offsets.astype(np.int64), 0, n_days - 1)
+    if rates is not None:
+        amounts = rates.convert(amounts, currencies, dates, currency)
+
+    known = cat_idx >= 0
+    flat = np.ravel_multi_index((user_idx[known], cat_idx[known], day_idx[known]), shape)
+    weights = np.asarray(amounts, dtype=float)[known]
+    return np.bincount(flat, weights=weights, minlength=np.prod(shape)).reshape(shape)
+
+
+def build_history_rates(users_data, month_key, categories=CATEGORIES, history_months=HISTORY_MONTHS,
+                        rates=None, currency=BASE_CURRENCY):
+    # Dépense journalière moyenne des mois précédents, NaN si aucun historique
+    history_keys = previous_month_keys(month_key, history_months)
+    month_days = np.array([days_in_month(k) for k in history_keys], dtype=float)
+    if rates is not None:
+        # Totaux stockés en devise de base, convertis au taux du début de chaque mois
+        month_days = month_days * rates.rates_at(currency, [f"{k}-01" for k in history_keys])
+    totals = np.full((len(users_data), history_months, len(categories)), np.nan)
+
+    # Mois présents, puis leurs totaux par catégorie aplatis en colonnes
+    present = [
+        (u, h, user_data.months[key].expenses)
+        for u, user_data in enumerate(users_data)
+        for h, key in enumerate(history_keys)
+        if key in user_data.months
+    ]
+    if present:
+        month_users = np.array([u for u, _, _ in present])
+        month_idx = np.array([h for _, h, _ in present])
+        totals[month_users, month_idx] = 0
+        names = [c for _, _, expenses in present for c in expenses]
+        values = [v for _, _, expenses in present for v in expenses.values()]
+        if names:
+            rows = np.repeat(np.arange(len(present)), [len(expenses) for _, _, expenses in present])
+            cat_idx = category_codes(names, categories)
+            known = cat_idx >= 0
+            totals[month_users[rows[known]], month_idx[rows[known]], cat_idx[known]] = (
+                np.asarray(values, dtype=float)[known]
+            )
+
+    rates = totals / month_days[None, :, None]
+    known = ~np.isnan(rates)
+    counts = known.sum(axis=1)
+    sums = np.where(known, rates, 0).sum(axis=1)
+    return np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+
+def project_month_end(daily, history_rates, day):
+    # Extrapolation du rythme du mois, pondérée par l'historique en début de mois
+    n_days = daily.shape[-1]
+    day = min(max(day, 1), n_days)
+    spent_to_date = daily[..., :day].sum(axis=-1)
+    recorded = daily.sum(axis=-1)
+    current_rate = spent_to_date / day
+
+    weight = day / n_days
+    rate = np.where(
+        np.isnan(history_rates),
+        current_rate,
+        weight * current_rate + (1 - weight) * np.nan_to_num(history_rates)
+    )
+    projected = spent_to_date + rate * (n_days - day)
+    return np.maximum(projected, recorded)
+
+
+def forecast_users(users_data, month_key, day, categories=CATEGORIES, rates=None, currency=BASE_CURRENCY):
+    daily = build_daily_series(users_data, month_key, categories, rates, currency)
+    history_rates = build_history_rates(users_data, month_key, categories, rates=rates, currency=currency)
+    return project_month_end(daily, history_rates, day)
+
+
+def forecast_user(user_data, month_key, day, categories=CATEGORIES, rates=None):
+    projected = forecast_users([user_data], month_key, day, categories, rates, user_data.currency)[0]
+    return dict(zip(categories, projected.tolist()))
+
+
+def generate_synthetic_data(n_users, month_key, expenses_per_month=60, seed=0):
+    rng = random.Random(seed)
+    data = {}
+    for u in range(n_users):
+        months = {}
+        for key in [month_key] + previous_month_keys(month_key, HISTORY_MONTHS):
+            n_days = days_in_month(key)
+            details = []
+            expenses = {}
+            for _ in range(expenses_per_month):
+                category = rng.choice(CATEGORIES)
+                amount = rng.randrange(100, 20000, 100)
+                details.append(Expense(
+                    category=category,
+                    amount=amount,
+                    date=f"{key}-{rng.randint(1, n_days):02d}"
+                ))
+                expenses[category] = expenses.get(category, 0) + amount
+            months[key] = MonthData(
+                budget={c: 100000 for c in CATEGORIES},
+                expenses=expenses,
+                expense_details=tuple(details)
+            )
+        data[f"user{u}"] = UserData(months=months, schema_version=SCHEMA_VERSION)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la prévision de fin de mois pour tous les utilisateurs")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--expenses', type=int, default=60, help="Dépenses par utilisateur et par mois")
+    parser.add_argument('--month', default="2025-07")
+    parser.add_argument('--day', type=int, default=12)
+    args = parser.parse_args()
+
+    data = generate_synthetic_data(args.users, args.month, args.expenses)
+
+    users_data = list(data.values())
+    start = time.perf_counter()
+    daily = build_daily_series(users_data, args.month)
+    history_rates = build_history_rates(users_data, args.month)
+    built = time.perf_counter()
+    project_month_end(daily, history_rates, args.day)
+    projected = time.perf_counter()
+
+    # Chemin complet, tel qu'appelé par l'application
+    start_total = time.perf_counter()
+    forecast_users(users_data, args.month, args.day)
+    total = time.perf_counter() - start_total
+
+    print(f"🔮 {len(users_data)} utilisateurs x {len(CATEGORIES)} catégories : "
+          f"séries {(built - start) * 1000:.1f} ms, prévision {(projected - built) * 1000:.1f} ms, "
+          f"forecast_users {total * 1000:.1f} ms ({total / len(users_data) * 1e6:.1f} µs/utilisateur)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+import argparse
+import bisect
+import fcntl
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import quote
+
+from schema import LedgerEntry, decode_entries, encode_entry
+
+# Un point de reprise (solde, position dans le fichier) tous les N mouvements
+CHECKPOINT_EVERY = 1000
+
+ENTRY_KINDS = {
+    'opening': "Solde d'ouverture",
+    'income': "Entrée d'argent",
+    'allocation': "Répartition",
+    'reset': "Réinitialisation",
+    'rollover': "Report du mois précédent",
+    'adjustment': "Ajustement"
+}
+
+
+class LedgerError(Exception):
+    pass
+
+
+def check(condition, message):
+    # Vérification toujours faite, y compris sous python -O
+    if not condition:
+        raise LedgerError(message)
+
+
+def get_ledger_dir(data_file):
+    return Path(data_file).resolve().parent / "ledger"
+
+
+class UserLedger:
+    # Journal d'un utilisateur : un mouvement par ligne, ajouté en fin de fichier.
+    # Les points de reprise (nombre de mouvements, position, solde, dernier horodatage)
+    # sont écrits dans un fichier voisin ; le solde à une date donnée repart du
+    # dernier point de reprise antérieur et ne rejoue que la fin du journal.
+    def __init__(self, path):
+        self.path = Path(path)
+        self.checkpoint_path = self.path.with_suffix('.checkpoints')
+        self._checkpoints = [(0, 0, 0, "")]
+        self._checkpoints_size = 0
+        self._size = 0
+        self.count = 0
+        self.balance = 0
+        self.last_timestamp = ""
+
+    def _file_size(self, path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _read_from(self, path, offset):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def refresh(self):
+        # Rattrape les mouvements ajoutés par un autre processus (rollover, restauration...)
+        size = self._file_size(self.checkpoint_path)
+        if size != self._checkpoints_size:
+            content = self._read_from(self.checkpoint_path, self._checkpoints_size)
+            # Seules les lignes complètes sont prises en compte
+            content = content[:content.rfind(b"\n") + 1]
+            for line in content.splitlines():
+                raw = json.loads(line)
+                self._checkpoints.append((raw['count'], raw['offset'], raw['balance'], raw['timestamp']))
+            self._checkpoints_size += len(content)
+            count, offset, balance, timestamp = self._checkpoints[-1]
+            if count > self.count:
+                self.count, self._size, self.balance, self.last_timestamp = count, offset, balance, timestamp
+
+        if self._file_size(self.path) != self._size:
+            content = self._read_from(self.path, self._size)
+            content = content[:content.rfind(b"\n") + 1]
+            for entry in decode_entries(content):
+                self.count += 1
+                self.balance += entry.amount
+                self.last_timestamp = entry.timestamp
+            self._size += len(content)
+
+    def append(self, entries, previous_balance=None):
+        # Sous verrou exclusif : l'application, le rollover et la restauration peuvent
+        # écrire le même journal ; les positions sont relues dans le fichier, pas en cache
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self.refresh()
+            if previous_balance is not None and previous_balance != self.balance:
+                # Solde antérieur au journal, ou mouvement perdu lors d'un arrêt brutal :
+                # un mouvement de rapprochement aligne le journal sur le solde enregistré
+                entries = [LedgerEntry(
+                    kind='opening' if self.count == 0 else 'adjustment',
+                    amount=previous_balance - self.balance,
+                    timestamp=entries[0].timestamp
+                )] + list(entries)
+
+            if f.seek(0, os.SEEK_END) != self._size:
+                # Ligne incomplète laissée par un arrêt brutal
+                f.truncate(self._size)
+            lines = [encode_entry(entry) for entry in entries]
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+            checkpoints = []
+            offset = self._size
+            for entry, line in zip(entries, lines):
+                offset += len(line)
+                self.count += 1
+                self.balance += entry.amount
+                self.last_timestamp = entry.timestamp
+                if self.count - self._checkpoints[-1][0] >= CHECKPOINT_EVERY:
+                    checkpoint = (self.count, offset, self.balance, self.last_timestamp)
+                    self._checkpoints.append(checkpoint)
+                    checkpoints.append(checkpoint)
+            self._size = offset
+
+            if checkpoints:
+                content = b"".join(
+                    json.dumps(dict(zip(('count', 'offset', 'balance', 'timestamp'), c))).encode('utf-8') + b"\n"
+                    for c in checkpoints
+                )
+                with open(self.checkpoint_path, 'ab') as checkpoint_file:
+                    if checkpoint_file.seek(0, os.SEEK_END) != self._checkpoints_size:
+                        checkpoint_file.truncate(self._checkpoints_size)
+                    checkpoint_file.write(content)
+                self._checkpoints_size += len(content)
+
+    def balance_at(self, timestamp):
+        # Dernier point de reprise dont le dernier mouvement précède la date, puis rejeu
+        if timestamp >= self.last_timestamp:
+            return self.balance
+        timestamps = [c[3] for c in self._checkpoints]
+        i = bisect.bisect_right(timestamps, timestamp) - 1
+        count, offset, balance, _ = self._checkpoints[i]
+        next_offset = self._checkpoints[i + 1][1] if i + 1 < len(self._checkpoints) else self._size
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            content = f.read(next_offset - offset)
+        for entry in decode_entries(content):
+            if entry.timestamp > timestamp:
+                break
+            balance += entry.amount
+        return balance
+
+    def entries(self, since_count=0):
+        # Mouvements à partir du n-ième, lus depuis le point de reprise le plus proche
+        counts = [c[0] for c in self._checkpoints]
+        i = bisect.bisect_right(counts, since_count) - 1
+        count, offset, balance, _ = self._checkpoints[i]
+        content = self._read_from(self.path, offset)[:self._size - offset]
+        entries = decode_entries(content)
+        skipped = since_count - count
+        for entry in entries[:skipped]:
+            balance += entry.amount
+        return balance, entries[skipped:]
+
+
+class Ledger:
+    def __init__(self, root):
+        self.root = Path(root)
+        self._ledgers = {}
+        self._lock = threading.RLock()
+
+    def get(self, username):
+        with self._lock:
+            ledger = self._ledgers.get(username)
+            if ledger is None:
+                ledger = UserLedger(self.root / f"{quote(username, safe='')}.jsonl")
+                self._ledgers[username] = ledger
+            ledger.refresh()
+            return ledger
+
+    def record(self, username, entry, previous_balance=None):
+        # previous_balance : solde enregistré avant le mouvement, pour rapprocher le journal
+        with self._lock:
+            self.get(username).append([entry], previous_balance)
+
+    def balance_at(self, username, timestamp):
+        with self._lock:
+            return self.get(username).balance_at(timestamp)
+
+    def history(self, username):
+        # Tous les mouvements, dans l'ordre du journal
+        with self._lock:
+            _, entries = self.get(username).entries()
+        return entries
+
+
+def run_benchmark(n_entries, queries, seed=0):
+    rng = random.Random(seed)
+    root = tempfile.mkdtemp(prefix="bench_ledger_")
+    try:
+        ledger = Ledger(root)
+        start_time = datetime(2020, 1, 1)
+        start = time.perf_counter()
+        batch = []
+        balance = 0
+        for i in range(n_entries):
+            amount = rng.randrange(1000, 100000, 1000)
+            kind = 'income'
+            if balance > amount and rng.random() < 0.4:
+                kind, amount = 'allocation', -amount
+            balance += amount
+            timestamp = (start_time + timedelta(minutes=30 * i)).isoformat()
+            batch.append(LedgerEntry(kind=kind, amount=amount, timestamp=timestamp))
+            if len(batch) == 1000:
+                ledger.get("bench").append(batch)
+                batch = []
+        if batch:
+            ledger.get("bench").append(batch)
+        write_time = time.perf_counter() - start
+        print(f"📒 {n_entries} mouvements écrits en {write_time * 1000:.0f} ms "
+              f"({os.path.getsize(Path(root) / 'bench.jsonl') / 1e6:.1f} Mo)")
+
+        # Réouverture à froid, comme au démarrage de l'application
+        start = time.perf_counter()
+        user_ledger = Ledger(root).get("bench")
+        print(f"  ouverture : {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        end_time = start_time + timedelta(minutes=30 * n_entries)
+        moments = [
+            (start_time + (end_time - start_time) * rng.random()).isoformat()
+            for _ in range(queries)
+        ]
+        start = time.perf_counter()
+        balances = [user_ledger.balance_at(moment) for moment in moments]
+        checkpoint_time = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        with open(user_ledger.path, 'rb') as f:
+            entries = decode_entries(f.read())
+        for moment, expected in zip(moments[:10], balances):
+            check(sum(e.amount for e in entries if e.timestamp <= moment) == expected,
+                  f"Solde au {moment} différent de la relecture complète")
+        scan_time = (time.perf_counter() - start) / min(queries, 10)
+
+        print(f"  solde à une date : {checkpoint_time * 1000:.2f} ms avec points de reprise, "
+              f"{scan_time * 1000:.1f} ms en relisant tout le journal (x{scan_time / checkpoint_time:.0f})")
+    finally:
+        shutil.rmtree(root)
+
+
+def _append_batches(root, seed, batches, batch_size):
+    rng = random.Random(seed)
+    ledger = Ledger(root)
+    for _ in range(batches):
+        ledger.get("check").append([
+            LedgerEntry(kind='income', amount=rng.randrange(1, 1000), timestamp=datetime.now().isoformat())
+            for _ in range(rng.randint(1, batch_size))
+        ])
+
+
+def run_check(n_entries, processes, seed=0):
+    # Vérifie points de reprise, recherche par date, rattrapage et écritures concurrentes
+    rng = random.Random(seed)
+    root = tempfile.mkdtemp(prefix="check_ledger_")
+    try:
+        writer = Ledger(root)
+        reader = Ledger(root)
+        reader.get("bench")
+        start_time = datetime(2020, 1, 1)
+        expected = []
+        while len(expected) < n_entries:
+            batch = [
+                LedgerEntry(
+                    kind='income',
+                    amount=rng.randrange(-5000, 10000),
+                    timestamp=(start_time + timedelta(minutes=len(expected) + i)).isoformat()
+                )
+                for i in range(rng.randint(1, 300))
+            ]
+            writer.get("bench").append(batch)
+            expected.extend(batch)
+
+        # Un autre processus rattrape les mouvements sans tout relire
+        user_ledger = reader.get("bench")
+        check((user_ledger.count, user_ledger.balance) == (len(expected), sum(e.amount for e in expected)),
+              f"Rattrapage : {user_ledger.count} mouvements, solde {user_ledger.balance}")
+        check(len(user_ledger._checkpoints) == len(expected) // CHECKPOINT_EVERY + 1,
+              f"{len(user_ledger._checkpoints)} points de reprise pour {len(expected)} mouvements")
+        for _ in range(200):
+            moment = (start_time + timedelta(minutes=rng.uniform(-10, len(expected) + 10))).isoformat()
+            check(user_ledger.balance_at(moment) == sum(e.amount for e in expected if e.timestamp <= moment),
+                  f"Solde au {moment} incorrect")
+            since = rng.randrange(len(expected) + 1)
+            balance, entries = user_ledger.entries(since)
+            check(balance == sum(e.amount for e in expected[:since]) and entries == expected[since:],
+                  f"Mouvements à partir du n°{since} incorrects")
+        print(f"✅ {len(expected)} mouvements : points de reprise, soldes à une date et rattrapage cohérents")
+
+        # Rapprochement avec le solde enregistré
+        writer.record("bench", LedgerEntry(kind='income', amount=100, timestamp="2099-01-01T00:00:00"),
+                      previous_balance=user_ledger.balance + 50)
+        check(reader.get("bench").balance == user_ledger.balance == sum(e.amount for e in expected) + 150,
+              f"Rapprochement : solde {user_ledger.balance}")
+        print("✅ rapprochement avec le solde enregistré")
+
+        # Plusieurs processus écrivent le même journal en même temps
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(_append_batches, [root] * processes, range(processes),
+                              [40] * processes, [100] * processes))
+        user_ledger = Ledger(root).get("check")
+        entries = decode_entries(user_ledger.path.read_bytes())
+        check(user_ledger.count == len(entries) and user_ledger.balance == sum(e.amount for e in entries),
+              f"Écritures concurrentes : {user_ledger.count} mouvements comptés, {len(entries)} dans le fichier")
+        for count, offset, balance, _ in user_ledger._checkpoints:
+            check(offset == len(b"".join(encode_entry(e) for e in entries[:count])),
+                  f"Point de reprise n°{count} : position {offset} incorrecte")
+            check(balance == sum(e.amount for e in entries[:count]),
+                  f"Point de reprise n°{count} : solde {balance} incorrect")
+        print(f"✅ {processes} processus, {len(entries)} mouvements écrits en concurrence sans corruption")
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal des mouvements du petit coffre")
+    parser.add_argument('--data-file', default="budget_data.json")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    balance_parser = subparsers.add_parser('balance', help="Solde d'un utilisateur à une date")
+    balance_parser.add_argument('--user', required=True)
+    balance_parser.add_argument('--at', help="Date ISO, ex. 2025-07-14T18:30 (par défaut : maintenant)")
+
+    bench_parser = subparsers.add_parser('bench', help="Mesure écriture et requêtes de solde")
+    bench_parser.add_argument('--entries', type=int, default=100000)
+    bench_parser.add_argument('--queries', type=int, default=200)
+
+    check_parser = subparsers.add_parser('check', help="Vérifie la cohérence du journal et des points de reprise")
+    check_parser.add_argument('--entries', type=int, default=5000)
+    check_parser.add_argument('--processes', type=int, default=4)
+
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        run_benchmark(args.entries, args.queries)
+    elif args.command == 'check':
+        try:
+            run_check(args.entries, args.processes)
+        except LedgerError as e:
+            parser.exit(1, f"❌ {e}\n")
+    elif args.command == 'balance':
+        at = args.at or datetime.now().isoformat()
+        balance = Ledger(get_ledger_dir(args.data_file)).balance_at(args.user, at)
+        print(f"💰 {args.user} au {at} : {balance:,.0f} FCFA")
+
+
+if __name__ == "__main__":
+    main()
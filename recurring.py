@@ -0,0 +1,169 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import date, datetime
+
+import numpy as np
+
+from forecast import days_in_month
+from schema import Expense, RecurringRule, replace
+
+FREQUENCIES = {
+    'monthly': "Mensuelle",
+    'weekly': "Hebdomadaire",
+    'custom': "Personnalisée"
+}
+
+
+def new_rule(category, amount, frequency, start_date, currency, description="", interval_days=0, end_date=""):
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Fréquence inconnue : {frequency}")
+    if frequency == 'custom' and interval_days < 1:
+        raise ValueError("L'intervalle doit être d'au moins un jour")
+    return RecurringRule(
+        id=uuid.uuid4().hex,
+        category=category,
+        amount=amount,
+        frequency=frequency,
+        start_date=start_date,
+        currency=currency,
+        description=description,
+        interval_days=interval_days if frequency == 'custom' else 0,
+        end_date=end_date
+    )
+
+
+def occurrence_dates(rule, month_key):
+    # Dates des occurrences d'une règle dans le mois, bornées par son début et sa fin
+    month_start = np.datetime64(f"{month_key}-01")
+    month_end = month_start + np.timedelta64(days_in_month(month_key) - 1, 'D')
+    rule_start = np.datetime64(rule.start_date)
+    first = max(month_start, rule_start)
+    last = min(month_end, np.datetime64(rule.end_date)) if rule.end_date else month_end
+    if first > last:
+        return []
+
+    if rule.frequency == 'monthly':
+        # Même jour du mois que la première occurrence, ramené au dernier jour si besoin
+        day = min(int(rule.start_date[8:10]), days_in_month(month_key))
+        occurrence = month_start + np.timedelta64(day - 1, 'D')
+        return [str(occurrence)] if first <= occurrence <= last else []
+
+    step = 7 if rule.frequency == 'weekly' else rule.interval_days
+    offset = (first - rule_start).astype(int)
+    first_occurrence = rule_start + np.timedelta64(-(-offset // step) * step, 'D')
+    return [str(d) for d in np.arange(first_occurrence, last + np.timedelta64(1, 'D'), step)]
+
+
+def pending_occurrences(user_data, month_key, until):
+    # (échues, à venir) : les occurrences du mois pas encore enregistrées,
+    # séparées par la date limite ; la clé (règle, date) rend la génération idempotente
+    month_data = user_data.months.get(month_key)
+    existing = set()
+    if month_data is not None:
+        existing = {(e.rule_id, e.date) for e in month_data.expense_details if e.rule_id}
+
+    due, upcoming = [], []
+    for rule in user_data.recurring:
+        for occurrence in occurrence_dates(rule, month_key):
+            if (rule.id, occurrence) in existing:
+                continue
+            expense = Expense(
+                category=rule.category,
+                amount=rule.amount,
+                description=rule.description,
+                date=occurrence,
+                timestamp=f"{occurrence}T00:00:00",
+                currency=rule.currency,
+                rule_id=rule.id
+            )
+            (due if occurrence <= until else upcoming).append(expense)
+    return due, upcoming
+
+
+def generate_all(budget_manager, month_key, until):
+    # Toutes les occurrences échues du mois, pour tous les utilisateurs, en une seule écriture
+    generated_users = 0
+    generated_expenses = 0
+    with budget_manager.transaction():
+        for username in list(budget_manager.data):
+            user_data = budget_manager.get_user_data(username)
+            if not user_data.recurring or month_key not in user_data.months:
+                continue
+            before = len(user_data.months[month_key].expense_details)
+            updated = budget_manager.generate_recurring(username, month_key, until)
+            if updated is not None:
+                generated_users += 1
+                generated_expenses += len(updated.months[month_key].expense_details) - before
+    return {'month': month_key, 'users': generated_users, 'expenses': generated_expenses}
+
+
+def run_benchmark(n_users, rules_per_user, month_key, seed=0):
+    from budget_manager import BudgetManager
+    from forecast import CATEGORIES, generate_synthetic_data
+
+    rng = random.Random(seed)
+    root = tempfile.mkdtemp(prefix="bench_recurring_")
+    try:
+        budget_manager = BudgetManager(
+            os.path.join(root, "budget_data.json"),
+            os.path.join(root, "users.json")
+        )
+        for username, user_data in generate_synthetic_data(n_users, month_key, expenses_per_month=20).items():
+            rules = tuple(
+                new_rule(
+                    rng.choice(CATEGORIES),
+                    rng.randrange(1000, 50000, 500),
+                    rng.choice(list(FREQUENCIES)),
+                    f"2025-01-{rng.randint(1, 28):02d}",
+                    "XOF",
+                    interval_days=rng.randint(2, 20)
+                )
+                for _ in range(rules_per_user)
+            )
+            budget_manager.data[username] = replace(user_data, recurring=rules)
+        budget_manager.save_data()
+
+        until = str(np.datetime64(f"{month_key}-01") + np.timedelta64(days_in_month(month_key) - 1, 'D'))
+        print(f"🔁 {n_users} utilisateurs, {rules_per_user} règle(s) chacun, mois {month_key}")
+        for label in ("1re génération", "relance"):
+            budget_manager.load_data()
+            start = time.perf_counter()
+            summary = generate_all(budget_manager, month_key, until)
+            elapsed = time.perf_counter() - start
+            print(f"  {label} : {summary['expenses']} occurrence(s) pour {summary['users']} utilisateur(s) "
+                  f"en {elapsed * 1000:.0f} ms ({n_users / elapsed:,.0f} utilisateurs/s)")
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère les dépenses récurrentes échues du mois")
+    parser.add_argument('--month', help="Mois YYYY-MM (par défaut : le mois courant)")
+    parser.add_argument('--until', help="Date limite YYYY-MM-DD (par défaut : aujourd'hui)")
+    parser.add_argument('--data-file', default="budget_data.json")
+    parser.add_argument('--users-file', default="users.json")
+    parser.add_argument('--bench', type=int, metavar='USERS',
+                        help="Mesure la génération sur des données synthétiques")
+    parser.add_argument('--rules', type=int, default=5, help="Règles par utilisateur pour --bench")
+    args = parser.parse_args()
+
+    month_key = args.month or datetime.now().strftime("%Y-%m")
+    if args.bench:
+        run_benchmark(args.bench, args.rules, month_key)
+        return
+
+    from budget_manager import BudgetManager
+
+    budget_manager = BudgetManager(args.data_file, args.users_file)
+    summary = generate_all(budget_manager, month_key, args.until or date.today().isoformat())
+    print(f"🔁 Mois {summary['month']} : {summary['expenses']} dépense(s) générée(s) "
+          f"pour {summary['users']} utilisateur(s)")
+
+
+if __name__ == "__main__":
+    main()
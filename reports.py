@@ -0,0 +1,223 @@
+import argparse
+import fcntl
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from schema import UserStore, decode_store, decode_user
+
+CATEGORY_COLUMNS = ['budget', 'spent', 'users', 'overbudget_users']
+MONTH_COLUMNS = ['users', 'budget', 'spent', 'overbudget_users']
+
+
+def aggregate_shard(chunks):
+    # Agrégats partiels d'un shard : seuls ses utilisateurs sont décodés dans le worker
+    categories = {}
+    months = {}
+    for chunk in chunks:
+        user_data = decode_user(chunk)
+        for month_key, month_data in user_data.months.items():
+            month_totals = months.setdefault(month_key, [0, 0, 0, 0])
+            month_totals[0] += 1
+            overbudget = False
+            for category in month_data.budget.keys() | month_data.expenses.keys():
+                budgeted = month_data.budget.get(category, 0)
+                spent = month_data.expenses.get(category, 0)
+                is_over = budgeted > 0 and spent > budgeted
+                overbudget = overbudget or is_over
+                totals = categories.setdefault((month_key, category), [0, 0, 0, 0])
+                totals[0] += budgeted
+                totals[1] += spent
+                totals[2] += 1
+                totals[3] += is_over
+                month_totals[1] += budgeted
+                month_totals[2] += spent
+            month_totals[3] += overbudget
+    return categories, months
+
+
+def merge_partials(partials):
+    categories = {}
+    months = {}
+    for partial_categories, partial_months in partials:
+        for merged, partial in ((categories, partial_categories), (months, partial_months)):
+            for key, values in partial.items():
+                totals = merged.setdefault(key, [0, 0, 0, 0])
+                for i, value in enumerate(values):
+                    totals[i] += value
+    return categories, months
+
+
+def is_line_store(data_file):
+    # Fichier écrit par encode_store : « { » puis un utilisateur par ligne
+    with open(data_file, 'rb') as f:
+        return f.read(3) == b'{\n"'
+
+
+def read_range(data_file, start, end):
+    # Utilisateurs dont la ligne commence dans [start, end) : chaque worker ne lit que sa plage
+    chunks = []
+    with open(data_file, 'rb') as f:
+        if start > 0:
+            # La ligne en cours appartient à la plage précédente
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.rstrip(b",\n")
+            if line in (b"{", b"}"):
+                continue
+            chunks.extend(decode_store(b"{" + line + b"}").values())
+    return chunks
+
+
+def aggregate_range(data_file, start, end):
+    return aggregate_shard(read_range(data_file, start, end))
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(workers):
+    # Pool créé une fois par processus et réutilisé : le démarrage des workers n'est
+    # payé qu'au premier rapport. spawn : un fork depuis le serveur Streamlit
+    # copierait ses threads et ses verrous dans un état incohérent.
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executors[workers] = executor
+        return executor
+
+
+@contextmanager
+def frozen_file(data_file):
+    # Chaque écriture de l'application remplace le fichier : un lien vers l'inode
+    # courant, pris sous le verrou des écrivains, garantit que tous les workers
+    # lisent la même version, aux mêmes positions
+    frozen_path = f"{data_file}.report-{os.getpid()}-{threading.get_ident()}"
+    with open(f"{data_file}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        try:
+            os.link(data_file, frozen_path)
+        except OSError:
+            # Système de fichiers sans liens physiques
+            shutil.copyfile(data_file, frozen_path)
+    try:
+        yield frozen_path
+    finally:
+        os.remove(frozen_path)
+
+
+def build_report(data_file, workers=None, shards_per_worker=4):
+    with frozen_file(data_file) as frozen_path:
+        return aggregate_report(frozen_path, workers, shards_per_worker)
+
+
+def aggregate_report(data_file, workers=None, shards_per_worker=4):
+    workers = workers or os.cpu_count()
+    if is_line_store(data_file):
+        size = os.path.getsize(data_file)
+        n_ranges = workers * shards_per_worker
+        bounds = [size * i // n_ranges for i in range(n_ranges + 1)]
+        starts, ends = bounds[:-1], bounds[1:]
+        if workers == 1:
+            partials = [aggregate_range(data_file, start, end) for start, end in zip(starts, ends)]
+        else:
+            executor = get_executor(workers)
+            partials = list(executor.map(aggregate_range, [data_file] * n_ranges, starts, ends))
+    else:
+        # Fichier d'un ancien format, lu d'un bloc jusqu'à sa prochaine réécriture
+        with open(data_file, 'rb') as f:
+            partials = [aggregate_shard(decode_store(f.read()).values())]
+    categories, months = merge_partials(partials)
+
+    category_report = pd.DataFrame(
+        [(month, category, *values) for (month, category), values in categories.items()],
+        columns=['month', 'category'] + CATEGORY_COLUMNS
+    ).sort_values(['month', 'category'], ignore_index=True)
+    category_report['overbudget_rate'] = category_report['overbudget_users'] / category_report['users']
+
+    month_report = pd.DataFrame(
+        [(month, *values) for month, values in months.items()],
+        columns=['month'] + MONTH_COLUMNS
+    ).sort_values('month', ignore_index=True)
+    month_report['overbudget_rate'] = month_report['overbudget_users'] / month_report['users']
+
+    return category_report, month_report
+
+
+def write_report(report, path):
+    # Parquet si pyarrow est disponible, CSV sinon
+    try:
+        report.to_parquet(path.with_suffix('.parquet'), index=False)
+        return path.with_suffix('.parquet')
+    except ImportError:
+        report.to_csv(path.with_suffix('.csv'), index=False)
+        return path.with_suffix('.csv')
+
+
+def run_scaling_benchmark(n_users, max_workers):
+    from forecast import generate_synthetic_data
+
+    store = UserStore()
+    for username, user_data in generate_synthetic_data(n_users, "2025-07").items():
+        store[username] = user_data
+    data_file = f"bench_report_{n_users}.json"
+    with open(data_file, 'wb') as f:
+        f.write(store.to_bytes())
+    del store
+
+    try:
+        print(f"📊 {n_users} utilisateurs ({os.path.getsize(data_file) / 1e6:.1f} Mo)")
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            # Premier appel hors mesure : démarrage du pool
+            build_report(data_file, workers)
+            start = time.perf_counter()
+            build_report(data_file, workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"  {workers} cœur(s) : {elapsed * 1000:.0f} ms (x{baseline / elapsed:.1f})")
+            workers *= 2
+    finally:
+        os.remove(data_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport d'administration sur l'ensemble des utilisateurs")
+    parser.add_argument('--data-file', default="budget_data.json")
+    parser.add_argument('--output-dir', default="reports")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--bench', type=int, metavar='USERS',
+                        help="Mesure le passage à l'échelle de 1 à --workers cœurs sur des données synthétiques")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_scaling_benchmark(args.bench, args.workers)
+        return
+
+    start = time.perf_counter()
+    category_report, month_report = build_report(args.data_file, args.workers)
+    elapsed = time.perf_counter() - start
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name, report in (('categories', category_report), ('months', month_report)):
+        print(f"💾 {write_report(report, output_dir / name)}")
+    print(f"📊 Rapport calculé en {elapsed * 1000:.0f} ms avec {args.workers} cœur(s)")
+
+
+if __name__ == "__main__":
+    main()
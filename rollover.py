@@ -0,0 +1,130 @@
+import argparse
+from datetime import datetime
+
+from budget_manager import BudgetManager
+from forecast import days_in_month
+from schema import MonthData, Rollover
+
+
+def get_next_month_key(month_key):
+    year, month = map(int, month_key.split('-'))
+    if month == 12:
+        return f"{year + 1}-01"
+    return f"{year}-{month + 1:02d}"
+
+
+def get_source_month(months, target_month):
+    # Le modèle est le dernier mois planifié avant le mois cible
+    previous_months = [m for m in months if m < target_month]
+    return max(previous_months) if previous_months else None
+
+
+def can_carry(months, source_month, target_month):
+    # Le reliquat d'un mois n'est versé qu'une fois, et seulement en avançant :
+    # pas de report vers un mois antérieur au dernier mois existant, ni depuis un
+    # mois dont le reliquat a déjà été reporté
+    if target_month < max(months):
+        return False
+    if any(m.rollover is not None and m.rollover.source_month == source_month for m in months.values()):
+        return False
+    # Un mois créé par le rollover et jamais utilisé n'a rien d'économisé : son budget
+    # n'est qu'une copie du mois précédent
+    source_data = months[source_month]
+    return source_data.rollover is None or bool(source_data.expense_details)
+
+
+def build_next_month(user_data, target_month, carry_savings=False):
+    months = user_data.months
+    if target_month in months:
+        return None
+
+    source_month = get_source_month(months, target_month)
+    if source_month is None:
+        return None
+    source_data = months[source_month]
+    budget = dict(source_data.budget)
+
+    carried = 0
+    if carry_savings and can_carry(months, source_month, target_month):
+        expenses = source_data.expenses
+        for category, budgeted in budget.items():
+            carried += max(budgeted - expenses.get(category, 0), 0)
+
+    month_data = MonthData(
+        budget=budget,
+        rollover=Rollover(source_month=source_month, carried_savings=carried)
+    )
+    return month_data, carried
+
+
+def rollover_shard(budget_manager, usernames, target_month, carry_savings=False):
+    # Un commit par shard, relu sous le verrou de fichier : les écritures faites
+    # par l'application pendant le job sont conservées. Une reprise après crash
+    # ne refait que les utilisateurs dont le mois cible n'existe pas encore.
+    rolled_users = 0
+    with budget_manager.transaction():
+        for username in usernames:
+            user_data = budget_manager.get_user_data(username)
+            source_month = get_source_month(user_data.months, target_month)
+            if (carry_savings and source_month and target_month not in user_data.months
+                    and can_carry(user_data.months, source_month, target_month)):
+                # Les occurrences récurrentes du mois source sont générées avant de calculer
+                # le report, même si ce mois n'a jamais été consulté : loyer et factures
+                # impayés ne sont pas versés au petit coffre
+                last_day = f"{source_month}-{days_in_month(source_month):02d}"
+                user_data = budget_manager.generate_recurring(username, source_month, last_day) or user_data
+            rolled = build_next_month(user_data, target_month, carry_savings)
+            if rolled is None:
+                continue
+            month_data, carried = rolled
+            budget_manager.create_month(username, target_month, month_data, carried)
+            rolled_users += 1
+    return rolled_users
+
+
+def run_rollover(budget_manager, target_month, carry_savings=False, shard_size=5000):
+    # Le calcul par utilisateur est négligeable devant le décodage et l'écriture du
+    # fichier : les shards sont traités dans ce processus, seul écrivain sous le verrou
+    usernames = sorted(budget_manager.data)
+    shards = [usernames[i:i + shard_size] for i in range(0, len(usernames), shard_size)]
+    rolled_users = 0
+    committed_shards = 0
+    for shard in shards:
+        rolled = rollover_shard(budget_manager, shard, target_month, carry_savings)
+        if rolled:
+            rolled_users += rolled
+            committed_shards += 1
+
+    return {
+        'month': target_month,
+        'shards': len(shards),
+        'committed_shards': committed_shards,
+        'rolled_users': rolled_users
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prépare le mois suivant pour tous les utilisateurs")
+    parser.add_argument('--month', help="Mois cible YYYY-MM (par défaut : le mois prochain)")
+    parser.add_argument('--carry-savings', action='store_true',
+                        help="Verse les montants non dépensés du mois précédent dans le petit coffre")
+    parser.add_argument('--shard-size', type=int, default=5000,
+                        help="Utilisateurs par écriture du fichier de données")
+    parser.add_argument('--data-file', default="budget_data.json")
+    parser.add_argument('--users-file', default="users.json")
+    args = parser.parse_args()
+
+    target_month = args.month or get_next_month_key(datetime.now().strftime("%Y-%m"))
+    budget_manager = BudgetManager(args.data_file, args.users_file)
+    summary = run_rollover(
+        budget_manager,
+        target_month,
+        carry_savings=args.carry_savings,
+        shard_size=args.shard_size
+    )
+    print(f"📅 Mois {summary['month']} : {summary['rolled_users']} utilisateur(s) préparé(s), "
+          f"{summary['committed_shards']}/{summary['shards']} shard(s) écrit(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import copyreg
+import dataclasses
+import json
+from types import MappingProxyType
+from typing import Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Version 1 : documents historiques sans champ schema_version
+SCHEMA_VERSION = 2
+
+# Devise de stockage des budgets, des totaux et du petit coffre
+BASE_CURRENCY = "XOF"
+
+if msgspec is not None:
+    Record = msgspec.Struct
+    field = msgspec.field
+    _set_field = msgspec.structs.force_setattr
+else:
+    # Sans msgspec, les mêmes déclarations deviennent des dataclasses
+    class Record:
+        def __init_subclass__(cls, gc=True, frozen=False, omit_defaults=False, **kwargs):
+            super().__init_subclass__(**kwargs)
+            dataclasses.dataclass(cls, frozen=frozen)
+
+    field = dataclasses.field
+    _set_field = object.__setattr__
+
+
+def frozen_map(mapping):
+    # Dictionnaire en lecture seule : un instantané partagé ne peut pas être modifié sur place
+    if isinstance(mapping, MappingProxyType):
+        return mapping
+    return MappingProxyType(dict(mapping))
+
+
+# Les enregistrements restent transmissibles aux processus de calcul
+copyreg.pickle(MappingProxyType, lambda mapping: (frozen_map, (dict(mapping),)))
+
+
+# Les enregistrements sont figés : un instantané lu peut être partagé entre
+# sessions, et toute modification produit une nouvelle version (voir BudgetManager).
+# gc=False : objets feuilles sans cycle, ignorés par le ramasse-miettes
+class Expense(Record, frozen=True, gc=False):
+    category: str
+    # Montant dans la devise de la dépense
+    amount: Union[int, float]
+    description: str = ""
+    date: str = ""
+    timestamp: str = ""
+    currency: str = BASE_CURRENCY
+    # Règle récurrente à l'origine de la dépense, vide pour une saisie manuelle
+    rule_id: str = ""
+
+
+# Dépense récurrente : ses occurrences sont générées à la consultation du mois
+class RecurringRule(Record, frozen=True, gc=False):
+    id: str
+    category: str
+    amount: Union[int, float]
+    frequency: str
+    start_date: str
+    currency: str = BASE_CURRENCY
+    description: str = ""
+    # Fréquence personnalisée : une occurrence tous les N jours
+    interval_days: int = 0
+    end_date: str = ""
+
+
+class Rollover(Record, frozen=True, gc=False):
+    source_month: str
+    carried_savings: int = 0
+
+
+class MonthData(Record, frozen=True):
+    budget: dict[str, int] = field(default_factory=dict)
+    expenses: dict[str, int] = field(default_factory=dict)
+    expense_details: tuple[Expense, ...] = ()
+    rollover: Optional[Rollover] = None
+
+    def __post_init__(self):
+        _set_field(self, 'budget', frozen_map(self.budget))
+        _set_field(self, 'expenses', frozen_map(self.expenses))
+
+
+class UserData(Record, frozen=True):
+    months: dict[str, MonthData] = field(default_factory=dict)
+    savings: int = 0
+    # Devise d'affichage choisie par l'utilisateur
+    currency: str = BASE_CURRENCY
+    recurring: tuple[RecurringRule, ...] = ()
+    # Absent des documents historiques, qui sont donc décodés en version 1
+    schema_version: int = 1
+    # Incrémentée à chaque modification, pour détecter les écritures concurrentes
+    version: int = 0
+
+    def __post_init__(self):
+        _set_field(self, 'months', frozen_map(self.months))
+
+
+# Mouvement du petit coffre, ajouté en fin de journal et jamais modifié.
+# amount est la variation du solde en devise de base.
+class LedgerEntry(Record, frozen=True, gc=False, omit_defaults=True):
+    kind: str
+    amount: int
+    timestamp: str
+    description: str = ""
+    currency: str = BASE_CURRENCY
+    original_amount: Union[int, float] = 0
+    month_key: str = ""
+    allocation: dict[str, int] = field(default_factory=dict)
+
+
+def new_user():
+    return UserData(schema_version=SCHEMA_VERSION)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def migrate_user(raw):
+    version = raw.get('schema_version', 1)
+    if version > SCHEMA_VERSION:
+        raise SchemaError(f"Version de schéma inconnue : {version}")
+
+    if version < 2:
+        raw.setdefault('months', {})
+        raw.setdefault('savings', 0)
+        for month_data in raw['months'].values():
+            month_data.setdefault('budget', {})
+            month_data.setdefault('expense_details', [])
+            # Les totaux manquants sont reconstruits à partir du détail
+            if 'expenses' not in month_data:
+                expenses = {}
+                for expense in month_data['expense_details']:
+                    expenses[expense['category']] = expenses.get(expense['category'], 0) + expense['amount']
+                month_data['expenses'] = expenses
+            rollover = month_data.get('rollover')
+            if rollover and 'from' in rollover:
+                rollover['source_month'] = rollover.pop('from')
+
+    raw['schema_version'] = SCHEMA_VERSION
+    return raw
+
+
+def _check(value, expected, path):
+    if not isinstance(value, expected) or isinstance(value, bool) and expected is not bool:
+        raise SchemaError(f"Type invalide pour {path} : {type(value).__name__}")
+    return value
+
+
+def _int_map(raw, path):
+    _check(raw, dict, path)
+    return {_check(k, str, path): _check(v, int, f"{path}.{k}") for k, v in raw.items()}
+
+
+def _month_from_dict(month_raw, path):
+    details = tuple(
+        Expense(
+            category=_check(e['category'], str, f"{path}.expense_details"),
+            amount=_check(e['amount'], (int, float), f"{path}.expense_details"),
+            description=_check(e.get('description', ""), str, f"{path}.expense_details"),
+            date=_check(e.get('date', ""), str, f"{path}.expense_details"),
+            timestamp=_check(e.get('timestamp', ""), str, f"{path}.expense_details"),
+            currency=_check(e.get('currency', BASE_CURRENCY), str, f"{path}.expense_details"),
+            rule_id=_check(e.get('rule_id', ""), str, f"{path}.expense_details")
+        )
+        for e in _check(month_raw['expense_details'], list, f"{path}.expense_details")
+    )
+    rollover = month_raw.get('rollover')
+    return MonthData(
+        budget=_int_map(month_raw['budget'], f"{path}.budget"),
+        expenses=_int_map(month_raw['expenses'], f"{path}.expenses"),
+        expense_details=details,
+        rollover=Rollover(**rollover) if rollover else None
+    )
+
+
+def _user_from_dict(raw):
+    months = {
+        month_key: _month_from_dict(month_raw, f"$.months.{month_key}")
+        for month_key, month_raw in _check(raw['months'], dict, "$.months").items()
+    }
+    return UserData(
+        months=months,
+        savings=_check(raw['savings'], int, "$.savings"),
+        currency=_check(raw.get('currency', BASE_CURRENCY), str, "$.currency"),
+        recurring=tuple(RecurringRule(**r) for r in _check(raw.get('recurring', []), list, "$.recurring")),
+        schema_version=raw['schema_version'],
+        version=_check(raw.get('version', 0), int, "$.version")
+    )
+
+
+if msgspec is not None:
+    _store_decoder = msgspec.json.Decoder(dict[str, msgspec.Raw])
+    _user_decoder = msgspec.json.Decoder(UserData)
+
+    def _enc_hook(value):
+        if isinstance(value, MappingProxyType):
+            return dict(value)
+        raise NotImplementedError(f"Type non sérialisable : {type(value).__name__}")
+
+    _encoder = msgspec.json.Encoder(enc_hook=_enc_hook)
+    _canonical_encoder = msgspec.json.Encoder(enc_hook=_enc_hook, order='sorted')
+    _entry_decoder = msgspec.json.Decoder(LedgerEntry)
+
+    def decode_store(content):
+        return _store_decoder.decode(content) if content.strip() else {}
+
+    def decode_user(chunk):
+        # Chemin rapide : document déjà à jour, décodé et validé directement
+        try:
+            user_data = _user_decoder.decode(chunk)
+            if user_data.schema_version == SCHEMA_VERSION:
+                return user_data
+        except msgspec.ValidationError:
+            pass
+
+        # Document historique : migration sur la forme brute puis validation
+        try:
+            return msgspec.convert(migrate_user(msgspec.json.decode(chunk)), UserData)
+        except (msgspec.ValidationError, KeyError, TypeError) as e:
+            raise SchemaError(str(e)) from e
+
+    def encode_store(chunks):
+        # Un utilisateur par ligne : le fichier se découpe en plages d'octets (voir reports.py)
+        lines = []
+        for username, value in chunks.items():
+            content = bytes(value) if isinstance(value, msgspec.Raw) else _encoder.encode(value)
+            if b"\n" in content:
+                # Bloc brut issu d'un fichier indenté, remis sur une seule ligne
+                content = msgspec.json.format(content, indent=-1)
+            lines.append(_encoder.encode(username) + b":" + content)
+        return b"{\n" + b",\n".join(lines) + b"\n}" if lines else b"{}"
+
+    def encode_user(user_data):
+        return msgspec.json.format(_encoder.encode(user_data), indent=2).decode('utf-8')
+
+    def to_builtins(value):
+        return msgspec.to_builtins(value, enc_hook=_enc_hook)
+
+    def replace(value, **changes):
+        return msgspec.structs.replace(value, **changes)
+
+    def from_builtins(raw):
+        try:
+            return msgspec.convert(migrate_user(raw), UserData)
+        except (msgspec.ValidationError, KeyError, TypeError) as e:
+            raise SchemaError(str(e)) from e
+
+    def month_from_builtins(raw):
+        try:
+            return msgspec.convert(raw, MonthData)
+        except msgspec.ValidationError as e:
+            raise SchemaError(str(e)) from e
+
+    def encode_canonical(value):
+        return _canonical_encoder.encode(value)
+
+    def decode_builtins(content):
+        return msgspec.json.decode(content)
+
+    def encode_entry(entry):
+        return _encoder.encode(entry) + b"\n"
+
+    def decode_entries(content):
+        return _entry_decoder.decode_lines(content)
+else:
+    def _loads(content):
+        return orjson.loads(content) if orjson is not None else json.loads(content)
+
+    def decode_store(content):
+        return _loads(content) if content.strip() else {}
+
+    def decode_user(chunk):
+        try:
+            return _user_from_dict(migrate_user(chunk))
+        except (KeyError, TypeError) as e:
+            raise SchemaError(str(e)) from e
+
+    def to_builtins(value):
+        if isinstance(value, (list, tuple)):
+            return [to_builtins(v) for v in value]
+        if isinstance(value, (dict, MappingProxyType)):
+            return {k: to_builtins(v) for k, v in value.items()}
+        if dataclasses.is_dataclass(value):
+            return {f.name: to_builtins(getattr(value, f.name)) for f in dataclasses.fields(value)}
+        return value
+
+    def replace(value, **changes):
+        return dataclasses.replace(value, **changes)
+
+    def encode_store(chunks):
+        lines = [
+            json.dumps(username, ensure_ascii=False) + ":"
+            + json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=to_builtins)
+            for username, value in chunks.items()
+        ]
+        return ("{\n" + ",\n".join(lines) + "\n}").encode('utf-8') if lines else b"{}"
+
+    def encode_user(user_data):
+        return json.dumps(to_builtins(user_data), indent=2, ensure_ascii=False)
+
+    def from_builtins(raw):
+        return decode_user(raw)
+
+    def month_from_builtins(raw):
+        try:
+            return _month_from_dict(raw, "$")
+        except (KeyError, TypeError) as e:
+            raise SchemaError(str(e)) from e
+
+    def encode_canonical(value):
+        return json.dumps(
+            value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=to_builtins
+        ).encode('utf-8')
+
+    def decode_builtins(content):
+        return _loads(content)
+
+    def encode_entry(entry):
+        raw = {
+            k: v for k, v in to_builtins(entry).items()
+            if v != LedgerEntry.__dataclass_fields__[k].default and v != {}
+        }
+        return json.dumps(raw, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+
+    def decode_entries(content):
+        return [LedgerEntry(**_loads(line)) for line in content.splitlines() if line.strip()]
+
+
+class UserStore:
+    # Les utilisateurs restent sous forme brute jusqu'à leur première lecture,
+    # où ils sont décodés et migrés ; les autres sont réécrits tels quels.
+    def __init__(self, chunks=None):
+        self._chunks = chunks or {}
+        self._users = {}
+
+    @classmethod
+    def from_bytes(cls, content):
+        return cls(decode_store(content))
+
+    def to_bytes(self):
+        chunks = dict(self._chunks)
+        chunks.update(self._users)
+        return encode_store(chunks)
+
+    def __getitem__(self, username):
+        if username not in self._users:
+            # Sûr en lecture concurrente : un décodage en double est simplement ignoré
+            chunk = self._chunks.get(username)
+            if chunk is not None:
+                self._users.setdefault(username, decode_user(chunk))
+                self._chunks.pop(username, None)
+        return self._users[username]
+
+    def __setitem__(self, username, user_data):
+        self._users[username] = user_data
+        self._chunks.pop(username, None)
+
+    def __delitem__(self, username):
+        if username not in self:
+            raise KeyError(username)
+        self._users.pop(username, None)
+        self._chunks.pop(username, None)
+
+    def __contains__(self, username):
+        return username in self._users or username in self._chunks
+
+    def __iter__(self):
+        yield from list(self._users)
+        yield from list(self._chunks)
+
+    def __len__(self):
+        return len(self._users) + len(self._chunks)
+
+    def get(self, username, default=None):
+        return self[username] if username in self else default
+
+    def raw_chunk(self, username):
+        # Document d'un utilisateur jamais décodé depuis la lecture du fichier, None sinon
+        chunk = self._chunks.get(username)
+        if msgspec is not None and isinstance(chunk, msgspec.Raw):
+            return bytes(chunk)
+        return None
+
+
+def main():
+    import argparse
+    import time
+
+    from forecast import generate_synthetic_data
+
+    parser = argparse.ArgumentParser(description="Benchmark du décodage du fichier de données")
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    store = UserStore()
+    for username, user_data in generate_synthetic_data(args.users, "2025-07").items():
+        store[username] = user_data
+    content = store.to_bytes()
+    del store
+
+    def best_of(run, repeat=3):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def decode_all():
+        store = UserStore.from_bytes(content)
+        for username in store:
+            store[username]
+
+    def decode_one():
+        store = UserStore.from_bytes(content)
+        store[next(iter(store))]
+
+    json_time = best_of(lambda: json.loads(content))
+    typed_time = best_of(decode_all)
+    lazy_time = best_of(decode_one)
+
+    # L'objectif de gain vise l'ouverture paresseuse, le cas de l'application : une session
+    # ne décode que son utilisateur. Le décodage complet (rapports, instantanés) reste
+    # dominé par la construction des dépenses ; les vues en lecture seule en font ~10 %.
+    print(f"📦 {len(content) / 1e6:.1f} Mo, {args.users} utilisateurs : json.load {json_time * 1000:.0f} ms")
+    print(f"  ouverture + 1er utilisateur (objectif) : {lazy_time * 1000:.0f} ms (x{json_time / lazy_time:.1f})")
+    print(f"  décodage typé complet : {typed_time * 1000:.0f} ms (x{json_time / typed_time:.1f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from budget_manager import BudgetManager
+from schema import UserStore, decode_builtins, decode_user, encode_canonical, from_builtins, replace
+
+MANIFEST_TIME_FORMAT = "%Y%m%d-%H%M%S-%f"
+# Nombre maximal d'instantanés différentiels entre deux manifestes complets
+FULL_SNAPSHOT_EVERY = 50
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def get_snapshot_dir(budget_manager):
+    return Path(budget_manager.data_file).resolve().parent / "snapshots"
+
+
+def same_content(entry, other):
+    # L'empreinte du document brut n'est qu'un raccourci : seuls les blocs comptent
+    return entry is not None and entry['header'] == other['header'] and entry['months'] == other['months']
+
+
+class SnapshotRepository:
+    # Chaque instantané est un manifeste qui référence, par utilisateur, un bloc
+    # d'en-tête et un bloc par mois ; les blocs sont stockés une seule fois,
+    # nommés par leur empreinte SHA-256. Un manifeste différentiel ne contient
+    # que les utilisateurs modifiés depuis l'instantané précédent.
+    # Un utilisateur dont le document brut ou l'objet décodé n'a pas changé depuis
+    # l'instantané précédent n'est ni décodé, ni réencodé, ni haché bloc par bloc.
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.manifests_dir = self.root / "manifests"
+        self._known_objects = set()
+        self._last_entries = None
+        self._last_manifest = None
+        self._partial_count = 0
+        # Dernier objet décodé vu par utilisateur, avec son entrée de manifeste
+        self._decoded_entries = {}
+        self._lock = threading.RLock()
+
+    def _object_path(self, digest):
+        return self.objects_dir / digest[:2] / digest
+
+    def _put_object(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        if digest in self._known_objects:
+            return digest, 0
+
+        path = self._object_path(digest)
+        written = 0
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            compressed = zlib.compress(content)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            written = len(compressed)
+        self._known_objects.add(digest)
+        return digest, written
+
+    def _get_object(self, digest):
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return decode_builtins(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            raise SnapshotError(f"Bloc manquant : {digest}")
+
+    def list_snapshots(self):
+        if not self.manifests_dir.exists():
+            return []
+        names = sorted(p.stem for p in self.manifests_dir.glob("*.json"))
+        return [datetime.strptime(name, MANIFEST_TIME_FORMAT) for name in names]
+
+    def _read_manifest(self, created):
+        with open(self.manifests_dir / f"{created.strftime(MANIFEST_TIME_FORMAT)}.json", 'rb') as f:
+            return decode_builtins(f.read())
+
+    def _load_last_entries(self):
+        # Relu seulement si un autre processus a écrit un manifeste depuis
+        snapshots = self.list_snapshots()
+        latest = snapshots[-1] if snapshots else None
+        if self._last_entries is None or latest != self._last_manifest:
+            self._last_entries, self._partial_count = self._scan(snapshots, datetime.max)
+            self._last_manifest = latest
+            for entry in self._last_entries.values():
+                self._known_objects.add(entry['header'])
+                self._known_objects.update(entry['months'].values())
+        return self._last_entries
+
+    def _build_entry(self, user_data):
+        header, written = self._put_object(encode_canonical(replace(user_data, months={})))
+        months = {}
+        for month_key, month_data in user_data.months.items():
+            months[month_key], month_written = self._put_object(encode_canonical(month_data))
+            written += month_written
+        return {'header': header, 'months': months}, written
+
+    def take_snapshot(self, store, usernames=None, full=False):
+        with self._lock:
+            return self._take_snapshot(store, usernames, full)
+
+    def _take_snapshot(self, store, usernames, full):
+        start = time.perf_counter()
+        created = datetime.now()
+        last_entries = self._load_last_entries()
+        entries = {}
+        written = 0
+
+        for username in (store if usernames is None else usernames):
+            raw = store.raw_chunk(username)
+            if raw is not None:
+                # Document brut : son empreinte suffit à reconnaître un utilisateur inchangé
+                raw_digest = hashlib.sha256(raw).hexdigest()
+                previous = last_entries.get(username)
+                if previous is not None and previous.get('raw') == raw_digest:
+                    entries[username] = previous
+                    continue
+                # Décodé sans être conservé dans le store, qui reste paresseux
+                entry, user_written = self._build_entry(decode_user(raw))
+                entry['raw'] = raw_digest
+            else:
+                user_data = store[username]
+                cached = self._decoded_entries.get(username)
+                if cached is not None and cached[0] is user_data:
+                    entries[username] = cached[1]
+                    continue
+                entry, user_written = self._build_entry(user_data)
+                self._decoded_entries[username] = (user_data, entry)
+            entries[username] = entry
+            written += user_written
+
+        if usernames is None:
+            # Un manifeste complet est écrit si des utilisateurs ont disparu
+            # ou si la chaîne de manifestes différentiels devient trop longue
+            full = (
+                full
+                or not last_entries
+                or any(username not in entries for username in last_entries)
+                or self._partial_count >= FULL_SNAPSHOT_EVERY
+            )
+        changed = entries if full else {
+            username: entry for username, entry in entries.items()
+            if not same_content(last_entries.get(username), entry)
+        }
+        last_entries.update(entries)
+        if full:
+            self._last_entries = dict(entries)
+            self._partial_count = 0
+        else:
+            self._partial_count += 1
+
+        manifest = encode_canonical({
+            'created': created.isoformat(),
+            'partial': not full,
+            'users': changed
+        })
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        path = self.manifests_dir / f"{created.strftime(MANIFEST_TIME_FORMAT)}.json"
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(manifest)
+        os.replace(tmp_path, path)
+        self._last_manifest = created
+
+        return {
+            'created': created,
+            'users': len(entries),
+            'changed_users': len(changed),
+            'full': full,
+            'bytes_written': written + len(manifest),
+            'duration': time.perf_counter() - start
+        }
+
+    def _build_user(self, entry):
+        raw = self._get_object(entry['header'])
+        raw['months'] = {m: self._get_object(digest) for m, digest in entry['months'].items()}
+        return from_builtins(raw)
+
+    def _scan(self, snapshots, at, username=None):
+        # État de chaque utilisateur : sa dernière entrée dans un manifeste antérieur à `at`,
+        # et le nombre de manifestes différentiels depuis le dernier complet
+        entries = {}
+        partial_count = 0
+        for created in reversed(snapshots):
+            if created > at:
+                continue
+            manifest = self._read_manifest(created)
+            for user, entry in manifest['users'].items():
+                if username is None or user == username:
+                    entries.setdefault(user, entry)
+            if not manifest['partial'] or username in entries:
+                break
+            partial_count += 1
+        return entries, partial_count
+
+    def _entries_at(self, at, username=None):
+        return self._scan(self.list_snapshots(), at, username)[0]
+
+    def restore_user(self, username, at):
+        entries = self._entries_at(at, username)
+        if username not in entries:
+            raise SnapshotError(f"Aucun instantané de {username} avant le {at:%d/%m/%Y %H:%M}")
+        return self._build_user(entries[username])
+
+    def restore_store(self, at):
+        entries = self._entries_at(at)
+        if not entries:
+            raise SnapshotError(f"Aucun instantané avant le {at:%d/%m/%Y %H:%M}")
+        store = UserStore()
+        for username, entry in entries.items():
+            store[username] = self._build_user(entry)
+        return store
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(budget_manager):
+    # Un dépôt par répertoire et par processus : manifestes et blocs connus restent en mémoire
+    root = get_snapshot_dir(budget_manager)
+    with _repositories_lock:
+        repository = _repositories.get(root)
+        if repository is None:
+            repository = _repositories[root] = SnapshotRepository(root)
+        return repository
+
+
+def take_snapshot(budget_manager, usernames=None):
+    return get_repository(budget_manager).take_snapshot(budget_manager.data, usernames)
+
+
+def list_snapshots(budget_manager):
+    return get_repository(budget_manager).list_snapshots()
+
+
+def restore(budget_manager, at, username=None):
+    repository = get_repository(budget_manager)
+    with budget_manager.transaction():
+        # L'état courant est d'abord sauvegardé : une restauration peut être annulée
+        repository.take_snapshot(budget_manager.data, None if username is None else [username])
+        if username is None:
+            restored = repository.restore_store(at)
+            # Les comptes (users.json) ne font pas partie des instantanés : un utilisateur
+            # inscrit depuis garde son compte, ses données repartent de zéro
+            for user in list(budget_manager.data):
+                if user not in restored:
+                    budget_manager.reset_user(user)
+            for user in restored:
+                budget_manager.restore_user_data(user, restored[user])
+        else:
+            budget_manager.restore_user_data(username, repository.restore_user(username, at))
+    if username is None:
+        repository.take_snapshot(budget_manager.data, full=True)
+
+
+def get_directory_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def run_benchmark(root, n_users, rounds, changed_users):
+    from forecast import generate_synthetic_data
+
+    rng = random.Random(0)
+    store = UserStore()
+    for username, user_data in generate_synthetic_data(n_users, "2025-07").items():
+        store[username] = user_data
+    repository = SnapshotRepository(root)
+
+    print(f"📸 {n_users} utilisateurs, {changed_users} modifié(s) entre deux instantanés")
+    for i in range(rounds):
+        if i > 0:
+            # Une dépense ajoutée au mois courant de quelques utilisateurs
+            for username in rng.sample(list(store), changed_users):
+                user_data = store[username]
+                month_data = user_data.months["2025-07"]
+                expense = replace(month_data.expense_details[0], amount=rng.randrange(100, 5000))
+                month_data = replace(month_data, expense_details=month_data.expense_details + (expense,))
+                store[username] = replace(user_data, months={**user_data.months, "2025-07": month_data})
+        # Fichier relu avant chaque instantané, comme par la commande snapshot --interval
+        store = UserStore.from_bytes(store.to_bytes())
+        result = repository.take_snapshot(store)
+        print(f"  #{i + 1} : {result['duration'] * 1000:.0f} ms, {result['changed_users']} utilisateur(s) écrit(s), "
+              f"+{result['bytes_written'] / 1e3:.1f} Ko "
+              f"(total {get_directory_size(root) / 1e6:.2f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instantanés incrémentaux des données budgétaires")
+    parser.add_argument('--data-file', default="budget_data.json")
+    parser.add_argument('--users-file', default="users.json")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help="Prend un instantané")
+    snapshot_parser.add_argument('--interval', type=int, help="Répète l'instantané toutes les N secondes")
+
+    subparsers.add_parser('list', help="Liste les instantanés")
+
+    restore_parser = subparsers.add_parser('restore', help="Restaure l'état à une date donnée (les comptes sont conservés)")
+    restore_parser.add_argument('--at', required=True, help="Date ISO, ex. 2025-07-14T18:30")
+    restore_parser.add_argument('--user', help="Restaure un seul utilisateur")
+
+    bench_parser = subparsers.add_parser('bench', help="Mesure durée et croissance sur des données synthétiques")
+    bench_parser.add_argument('--root', default="bench_snapshots")
+    bench_parser.add_argument('--users', type=int, default=2000)
+    bench_parser.add_argument('--rounds', type=int, default=5)
+    bench_parser.add_argument('--changed', type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        run_benchmark(args.root, args.users, args.rounds, args.changed)
+        return
+
+    budget_manager = BudgetManager(args.data_file, args.users_file)
+    if args.command == 'snapshot':
+        while True:
+            result = take_snapshot(budget_manager)
+            print(f"📸 {result['created']:%d/%m/%Y %H:%M:%S} : {result['changed_users']}/{result['users']} utilisateur(s), "
+                  f"{result['bytes_written'] / 1e3:.1f} Ko écrits en {result['duration'] * 1000:.0f} ms")
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+            budget_manager.refresh_if_changed()
+    elif args.command == 'list':
+        for created in list_snapshots(budget_manager):
+            print(created.isoformat(sep=' ', timespec='seconds'))
+    elif args.command == 'restore':
+        try:
+            restore(budget_manager, datetime.fromisoformat(args.at), args.user)
+        except SnapshotError as e:
+            parser.exit(1, f"❌ {e}\n")
+        print(f"♻️ Données restaurées au {args.at}")
+
+
+if __name__ == "__main__":
+    main()
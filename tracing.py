@@ -0,0 +1,295 @@
+import argparse
+import atexit
+import functools
+import gzip
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from currency import load_rate_table
+from schema import Expense, RecurringRule, encode_canonical, from_builtins, month_from_builtins, to_builtins
+
+# Version 2 : arguments enregistrés par nom
+TRACE_FORMAT = 2
+# Les enregistrements sont écrits sur disque au moins toutes les N secondes
+FLUSH_INTERVAL = 1.0
+
+# Conversion des arguments enregistrés vers ceux des méthodes de BudgetManager
+ARG_DECODERS = {
+    'expense': lambda raw: Expense(**raw),
+    'rule': lambda raw: RecurringRule(**raw),
+    'month_data': month_from_builtins,
+    'user_data': from_builtins
+}
+
+
+class TraceRecorder:
+    # Journal compact (JSON par ligne, compressé gzip) des mutations et de leur durée.
+    # L'état des fichiers de données et la table de taux au démarrage sont copiés
+    # à côté de la trace, pour pouvoir rejouer à partir du même point de départ.
+    def __init__(self, path, data_file=None, users_file=None, rates_file=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_flush = self._start
+        self.count = 0
+
+        initial = {}
+        for name, source in (('data', data_file), ('users', users_file), ('rates', rates_file)):
+            if source and os.path.exists(source):
+                target = f"{path}.{name}.json"
+                shutil.copyfile(source, target)
+                initial[name] = os.path.basename(target)
+
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._write({
+            'format': TRACE_FORMAT,
+            'started': datetime.now().isoformat(),
+            'initial': initial,
+            'rates_version': load_rate_table(rates_file).version if rates_file else None
+        })
+        atexit.register(self.close)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        self._file.write("\n")
+
+    def record(self, op, username, args, start, error=None):
+        end = time.perf_counter()
+        record = {
+            't': round(start - self._start, 6),
+            'op': op,
+            'user': username,
+            'args': to_builtins(args),
+            'd': round(end - start, 6)
+        }
+        if error:
+            record['err'] = error
+        with self._lock:
+            self._write(record)
+            self.count += 1
+            if end - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = end
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def traced(redact=(), skip_none=False, defaults=None):
+    # Enregistre l'appel si la trace est activée, arguments nommés compris.
+    # redact : arguments jamais écrits (mots de passe) ; skip_none : ignore les appels
+    # sans écriture ; defaults : valeurs implicites (date du jour...) fixées à l'appel
+    # et enregistrées, pour que le rejeu ne dépende pas du jour où il est lancé
+    def decorator(method):
+        op = method.__name__
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, username, *args, **kwargs):
+            recorder = self.recorder
+            if recorder is None:
+                return method(self, username, *args, **kwargs)
+            bound = signature.bind(self, username, *args, **kwargs)
+            for name, default in (defaults or {}).items():
+                if bound.arguments.get(name) is None:
+                    bound.arguments[name] = default()
+            recorded_args = {
+                name: None if name in redact else value
+                for name, value in bound.arguments.items()
+                if name not in ('self', 'username')
+            }
+            start = time.perf_counter()
+            try:
+                result = method(*bound.args, **bound.kwargs)
+            except Exception as e:
+                recorder.record(op, username, recorded_args, start, type(e).__name__)
+                raise
+            if result is not None or not skip_none:
+                recorder.record(op, username, recorded_args, start)
+            return result
+        return wrapper
+    return decorator
+
+
+def read_trace(path):
+    records = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != TRACE_FORMAT:
+            raise ValueError(f"Format de trace inconnu : {header.get('format')}")
+        try:
+            for line in f:
+                records.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            # Trace interrompue par un arrêt brutal : les enregistrements complets sont gardés
+            pass
+    # Ordre de début des appels, indépendamment de l'ordre d'écriture
+    records.sort(key=lambda record: record['t'])
+    return header, records
+
+
+def load_manager_class(spec):
+    module_name, class_name = spec.split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def state_checksum(budget_manager):
+    # Empreinte de l'état final, indépendante de l'ordre des utilisateurs et du format de stockage.
+    # Les mots de passe, jamais enregistrés, n'en font pas partie : seuls les comptes comptent.
+    digest = hashlib.sha256()
+    for username in sorted(budget_manager.data):
+        digest.update(username.encode('utf-8'))
+        digest.update(encode_canonical(budget_manager.get_user_data(username)))
+    digest.update(encode_canonical(sorted(budget_manager.users)))
+    return digest.hexdigest()
+
+
+def apply(budget_manager, record):
+    args = {
+        name: ARG_DECODERS[name](value) if name in ARG_DECODERS and value is not None else value
+        for name, value in record['args'].items()
+    }
+    if record['op'] == 'register_user':
+        # Les mots de passe ne sont pas enregistrés
+        args['password'] = "replay"
+    return getattr(budget_manager, record['op'])(record['user'], **args)
+
+
+def replay(records, budget_manager, speed=0.0, concurrency=1):
+    # Les mutations d'un même utilisateur restent dans l'ordre, sur le même thread :
+    # l'état final ne dépend pas de la concurrence choisie
+    partitions = defaultdict(list)
+    for record in records:
+        partitions[zlib.crc32(record['user'].encode('utf-8')) % concurrency].append(record)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run(partition):
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        for record in partition:
+            if record.get('err'):
+                # Mutation refusée à l'enregistrement (version périmée, montant invalide...) :
+                # elle n'a rien modifié et n'est pas rejouée
+                continue
+            if speed > 0:
+                delay = record['t'] / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            op_start = time.perf_counter()
+            try:
+                apply(budget_manager, record)
+            except Exception:
+                local_errors[record['op']] += 1
+            local_latencies[record['op']].append(time.perf_counter() - op_start)
+        with lock:
+            for op, values in local_latencies.items():
+                latencies[op].extend(values)
+            for op, count in local_errors.items():
+                errors[op] += count
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, partitions.values()))
+    elapsed = time.perf_counter() - start
+
+    replayed = sum(len(values) for values in latencies.values())
+    return {
+        'operations': replayed,
+        'skipped': len(records) - replayed,
+        'elapsed': elapsed,
+        'throughput': replayed / elapsed if elapsed else 0.0,
+        'latencies': dict(latencies),
+        'errors': dict(errors),
+        'checksum': state_checksum(budget_manager)
+    }
+
+
+def percentiles(values):
+    p50, p90, p99 = np.percentile(np.asarray(values) * 1000, [50, 90, 99])
+    return p50, p90, p99, max(values) * 1000
+
+
+def print_report(summary, recorded):
+    print(f"▶️ {summary['operations']} mutation(s) rejouée(s) en {summary['elapsed']:.2f} s "
+          f"({summary['throughput']:,.0f} op/s), {summary['skipped']} refusée(s) à l'enregistrement ignorée(s)")
+    print(f"  {'opération':<20} {'nombre':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'p50 enreg.':>10} {'erreurs':>7}")
+    all_values = []
+    for op in sorted(summary['latencies']):
+        values = summary['latencies'][op]
+        all_values.extend(values)
+        p50, p90, p99, worst = percentiles(values)
+        recorded_p50 = np.percentile(np.asarray(recorded[op]) * 1000, 50)
+        print(f"  {op:<20} {len(values):>7} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {worst:>8.2f} "
+              f"{recorded_p50:>10.2f} {summary['errors'].get(op, 0):>7}")
+    if all_values:
+        p50, p90, p99, worst = percentiles(all_values)
+        print(f"  {'total':<20} {len(all_values):>7} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {worst:>8.2f}")
+    print(f"🔑 Empreinte de l'état final : {summary['checksum']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejoue une trace de mutations enregistrée")
+    parser.add_argument('trace', help="Fichier de trace (BUDGET_TRACE_FILE)")
+    parser.add_argument('--manager', default="budget_manager:BudgetManager",
+                        help="Gestionnaire de stockage à évaluer, module:Classe")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="1 = vitesse enregistrée, 2 = deux fois plus vite, 0 = aussi vite que possible")
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--work-dir', help="Répertoire des fichiers rejoués (par défaut : temporaire, supprimé)")
+    parser.add_argument('--expect', help="Empreinte attendue ; code de sortie 1 si l'état final diffère")
+    args = parser.parse_args()
+
+    header, records = read_trace(args.trace)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="replay_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        # Départ depuis l'état copié au début de l'enregistrement
+        files = {}
+        for name in ('data', 'users', 'rates'):
+            files[name] = os.path.join(work_dir, f"{name}.json")
+            if name in header['initial']:
+                source = os.path.join(os.path.dirname(os.path.abspath(args.trace)), header['initial'][name])
+                shutil.copyfile(source, files[name])
+        # Les montants convertis ne dépendent pas du répertoire où le rejeu est lancé
+        budget_manager = load_manager_class(args.manager)(files['data'], files['users'], files['rates'])
+        rates_version = budget_manager.rates.version
+        if header.get('rates_version') not in (None, rates_version):
+            print(f"⚠️ Table de taux {rates_version} au lieu de {header['rates_version']} à l'enregistrement")
+
+        recorded = defaultdict(list)
+        for record in records:
+            recorded[record['op']].append(record['d'])
+
+        print(f"📼 Trace du {header['started']} : {len(records)} mutation(s), "
+              f"{records[-1]['t'] if records else 0:.1f} s enregistrées")
+        summary = replay(records, budget_manager, args.speed, args.concurrency)
+        print_report(summary, recorded)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    if args.expect and args.expect != summary['checksum']:
+        parser.exit(1, "❌ L'état final diffère de l'empreinte attendue\n")
+
+
+if __name__ == "__main__":
+    main()